@@ -2,24 +2,58 @@
 import time
 import random
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 
 
-from utils.text_extraction import extract_text_from_pdf, clean_text
-from models.question_generator import generate_questions_from_text
-from services.storage import save_questions_json, load_questions_json
+from models.grading import FREE_TEXT_TYPES, grade_answer
+from models.quiz_assembler import assemble_quiz
+from services.cohort import (
+    cohort_summary,
+    question_stats,
+    record_attempt,
+    response_time_distribution,
+    topic_accuracy_over_time,
+)
+from services.provenance import questions_on_pages, read_passage
+from services.retrieval import has_chunk_index
+from services.revisions import document_key
+from services.storage import load_shared_questions, new_session_id
+from services.usage import session_tokens, get_budget
+from services.warmup import start as start_warmup
+from services.jobs import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    save_upload,
+    submit_job,
+    submit_topic_job,
+    get_job,
+    load_job_result,
+    job_result_path,
+    ensure_worker_running,
+)
+from utils import instrumentation, profiling
 from services.analytics import (
     compute_accuracy,
     average_response_time,
     total_score,
-    difficulty_progression,
+    difficulty_levels,
+    downsample_lttb,
+    rolling_accuracy,
+    ROLLING_WINDOW,
     topic_wise_performance,
     hardest_topics,
     generate_recommendation,
 )
 
+# With SMARTQUIZZER_PROFILE including "rerun", the script runs itself once
+# under the profiler and this outer run stops
+if profiling.PROFILE_RERUNS and not profiling.in_profiled_rerun():
+    profiling.run_profiled_rerun(__file__, globals())
+    st.stop()
+
 # -------------------- PAGE CONFIG --------------------
 
 st.set_page_config(page_title="SmartQuizzer", layout="wide")
@@ -193,26 +227,183 @@ st.markdown(base_css, unsafe_allow_html=True)
 
 # -------------------- HELPERS --------------------
 
-def clean_questions(questions):
-    """Remove invalid questions (empty text/answer or missing distractors)."""
-    if not questions:
-        return []
+def rejection_summary(report):
+    """One-line summary of the questions dropped by validation, per rule."""
+    if not report or not report.get("rejected"):
+        return ""
+    rejected = report["rejected"]
+    parts = [f"{count} × {rule}" for rule, count in sorted(rejected.items(), key=lambda kv: -kv[1])]
+    return f"Filtered out {sum(rejected.values())} generated questions: " + ", ".join(parts)
+
+
+def preprocessing_summary(report):
+    """One-line summary of the repeated page text removed before generation."""
+    stats = (report or {}).get("preprocessing") or {}
+    if not stats.get("tokens_saved"):
+        return ""
+    skipped = stats.get("toc_pages", 0) + stats.get("index_pages", 0)
+    pages_note = f", skipped {skipped} contents/index pages" if skipped else ""
+    return (
+        f"Removed repeated headers, footers and page numbers{pages_note}: "
+        f"~{stats['tokens_saved']:,} of {stats['tokens_before']:,} tokens saved"
+    )
+
+
+def revision_summary(report):
+    """One-line summary of what a re-uploaded document reused from its previous version."""
+    stats = (report or {}).get("revision") or {}
+    if not stats:
+        return ""
+    return (
+        f"Updated from the previous version: {stats['pages_changed']} pages changed, "
+        f"{stats['chunks_regenerated']} of {stats['chunks_regenerated'] + stats['chunks_reused']} "
+        f"chunks regenerated, {stats['questions_kept']} questions kept, "
+        f"{stats['questions_retired']} retired"
+    )
+
+
+def render_metrics_summary(summary):
+    """Tables of stage timings and counters from one instrumentation snapshot."""
+    timings = summary.get("timings", {})
+    if timings:
+        st.dataframe(
+            pd.DataFrame(
+                [
+                    {
+                        "metric": name,
+                        "count": stats["count"],
+                        "p50": stats["p50"],
+                        "p90": stats["p90"],
+                        "p99": stats["p99"],
+                        "total": stats["sum"],
+                    }
+                    for name, stats in sorted(timings.items())
+                ]
+            ),
+            hide_index=True,
+            use_container_width=True,
+        )
+    counters = summary.get("counters", {})
+    if counters:
+        st.dataframe(
+            pd.DataFrame(
+                [{"counter": name, "value": value} for name, value in sorted(counters.items())]
+            ),
+            hide_index=True,
+            use_container_width=True,
+        )
+    if not timings and not counters:
+        st.caption("Nothing recorded yet.")
+
+
+# Bank positions remembered per session so restarted quizzes serve new questions
+RECENT_QUESTIONS_LIMIT = 500
+
+# Questions generated per "more questions on a weak topic" request
+TOPIC_FOLLOW_UP_QUESTIONS = 10
+
+# Attempts a question needs before the class-wide view lists its p-value
+COHORT_MIN_ATTEMPTS = 5
+
+
+def bump_history_version():
+    # Analytics figures are cached per (history version, length)
+    st.session_state.history_version = st.session_state.get("history_version", 0) + 1
+
+
+def clear_quiz_state():
+    for key in list(st.session_state.keys()):
+        if key.startswith("quiz_"):
+            del st.session_state[key]
+    bump_history_version()
+
+
+def reset_quiz_history():
+    st.session_state.quiz_history = []
+    bump_history_version()
+
+
+def finish_generation_job(message):
+    """Forget the active job and rerun the whole app so every tab sees the result."""
+    st.session_state.gen_job_id = None
+    st.session_state.gen_message = message
+    st.query_params.pop("job", None)
+    st.rerun()
+
+
+@st.fragment(run_every=1.0)
+def generation_job_status(job_id):
+    """Poll the background job without rerunning the rest of the page."""
+    job = get_job(job_id)
+    if job is None:
+        finish_generation_job(("error", "The generation job could not be found."))
+        return
+
+    if job["status"] == STATUS_FAILED:
+        if (job["error"] or "").startswith("BudgetExceeded"):
+            finish_generation_job(("error", "Your token budget for this session is used up."))
+        else:
+            finish_generation_job(("error", "Question generation failed. Please try again."))
+        return
+
+    if job["status"] == STATUS_DONE:
+        questions = load_job_result(job_id)
+        if not questions:
+            finish_generation_job(("warning", "No valid questions could be generated from this PDF."))
+            return
+        # The finished bank is shared read-only; this session only points at it
+        clear_quiz_state()
+        st.session_state.bank_path = str(job_result_path(job_id))
+        st.session_state.bank_doc_hash = job["doc_hash"]
+        # Survives a browser refresh, which starts a new session
+        st.query_params["bank"] = job_id
+        finish_generation_job(
+            (
+                "ready",
+                (
+                    len(questions),
+                    rejection_summary(job["report"]),
+                    preprocessing_summary(job["report"]),
+                    revision_summary(job["report"]),
+                ),
+            )
+        )
+        return
+
+    total = job["total_chunks"]
+    done = job["done_chunks"]
+    if total:
+        st.progress(done / total, text=f"Generating questions… chunk {done}/{total}")
+    else:
+        st.progress(0.0, text="Waiting for the generation worker…")
+        ensure_worker_running()
+
+
+# -------------------- SESSION --------------------
+
+# Namespaces this browser session's uploads on disk
+if "session_id" not in st.session_state:
+    st.session_state.session_id = new_session_id()
+    st.session_state.session_started_at = time.time()
+
+# A refreshed page is a new session: ?bank= points it back at the finished
+# job whose bank it was quizzing on
+if "bank_path" not in st.session_state and st.query_params.get("bank"):
+    bank_job = get_job(st.query_params["bank"])
+    if bank_job is not None and bank_job["status"] == STATUS_DONE:
+        st.session_state.bank_path = str(job_result_path(bank_job["id"]))
+        st.session_state.bank_doc_hash = bank_job["doc_hash"]
+    else:
+        st.query_params.pop("bank", None)
 
-    cleaned = []
-    for q in questions:
-        text = str(q.get("question", "")).strip()
-        ans = str(q.get("answer", "")).strip()
-        distractors = [str(d).strip() for d in q.get("distractors", [])]
 
-        if not text or not ans:
-            continue
-        if not distractors:
-            continue
+@st.cache_resource
+def server_warmup():
+    """Warms this server process once (see services.warmup); shared by every session."""
+    return start_warmup()
 
-        q["distractors"] = distractors
-        cleaned.append(q)
 
-    return cleaned
+warmup = server_warmup()
 
 
 # -------------------- HEADER --------------------
@@ -229,6 +420,9 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+if not warmup.ready.is_set():
+    st.caption("⏳ Warming up: loading question banks and starting the generation worker…")
+
 tab1, tab2, tab3 = st.tabs(["⚙️ Upload & Generate", "📝 Quiz", "📊 Analytics"])
 
 # =========================================================
@@ -325,8 +519,21 @@ with tab1:
             )
 
 
+            skip_toc_and_index = st.checkbox(
+                "Skip table of contents and index pages",
+                value=True,
+            )
+
+
             st.caption("Pro tip: Use focused chapter notes for sharper questions.")
 
+            used_tokens = session_tokens(st.session_state.session_id)
+            token_budget = get_budget(st.session_state.session_id)
+            if token_budget:
+                st.caption(f"🔢 Tokens used this session: {used_tokens:,} / {token_budget:,}")
+            elif used_tokens:
+                st.caption(f"🔢 Tokens used this session: {used_tokens:,}")
+
 
             generate_clicked = st.button(
                 "🚀 Extract & Generate Questions",
@@ -362,35 +569,45 @@ with tab1:
 
 
     # ---- Generation logic ----
-    if uploaded_file is not None and generate_clicked:
-        with open("temp_upload.pdf", "wb") as f:
-            f.write(uploaded_file.read())
-
-
-        raw_text = extract_text_from_pdf("temp_upload.pdf")
-        clean = clean_text(raw_text)
-
-
-        with st.spinner("Generating questions using the LLM..."):
-            questions = generate_questions_from_text(
-                clean, num_questions=num_questions
-            ) or []
+    if "gen_job_id" not in st.session_state:
+        # Survives a browser refresh through the ?job= query parameter
+        st.session_state.gen_job_id = st.query_params.get("job")
 
-
-        questions = clean_questions(questions)
-
-
-        if questions:
-            save_questions_json(questions)
-            st.success(
-                f"Generated {len(questions)} questions and saved to data/questions.json"
-            )
-
-
-            # clear old quiz state
-            for key in list(st.session_state.keys()):
-                if key.startswith("options_") or key.startswith("quiz_"):
-                    del st.session_state[key]
+    if uploaded_file is not None and generate_clicked:
+        upload = save_upload(uploaded_file.getvalue(), st.session_state.session_id)
+        job_id = submit_job(
+            upload["doc_hash"],
+            upload["pdf_path"],
+            {
+                "num_questions": num_questions,
+                "skip_toc_and_index": skip_toc_and_index,
+            },
+            session_id=st.session_state.session_id,
+            document_key=document_key(st.session_state.session_id, uploaded_file.name),
+        )
+        st.session_state.gen_job_id = job_id
+        st.query_params["job"] = job_id
+        ensure_worker_running()
+
+    if st.session_state.gen_job_id:
+        generation_job_status(st.session_state.gen_job_id)
+
+    gen_message = st.session_state.pop("gen_message", None)
+    if gen_message is not None:
+        kind, value = gen_message
+        if kind == "error":
+            st.error(value)
+        elif kind == "warning":
+            st.warning(value)
+        elif kind == "ready":
+            ready_count, rejections, preprocessing, revision = value
+            st.success(f"Generated {ready_count} questions for this session.")
+            if rejections:
+                st.caption(rejections)
+            if preprocessing:
+                st.caption(preprocessing)
+            if revision:
+                st.caption(revision)
 
 
             # Non-clickable but interactive-looking info card
@@ -413,7 +630,7 @@ with tab1:
                             Ready to practice?
                         </div>
                         <div style="color:#9ca3af;font-size:0.9rem;">
-                            {len(questions)} questions are ready. Open the <b>Quiz</b> tab above and start your session.
+                            {ready_count} questions are ready. Open the <b>Quiz</b> tab above and start your session.
                         </div>
                     </div>
                     <div style="
@@ -443,14 +660,55 @@ with tab1:
 # =========================================================
 # TAB 2: QUIZ – FULLSCREEN CUSTOM LAYOUT (NO STRIP)
 # =========================================================
-with tab2:
-    # -------- LOAD QUESTIONS --------
-    questions = load_questions_json() or []
-    total_questions = len(questions)
+def build_quiz_options(questions):
+    """Shuffle the answer options of every question once per quiz."""
+    all_options = []
+    for q in questions:
+        opts = [q["answer"]] + q.get("distractors", [])
+        opts = list(dict.fromkeys(opts))
+        random.shuffle(opts)
+        all_options.append(opts)
+    return all_options
+
+
+# Callbacks run before the fragment reruns, so these transitions never
+# need a full-app rerun.
+def go_to_next_question(q_num):
+    if st.session_state.quiz_attempts >= q_num:
+        st.session_state.quiz_index += 1
+        st.session_state.quiz_start_time = time.time()
+
+
+def close_result_view():
+    st.session_state.show_result_view = False
+
+
+def show_source_passage(q, expanded=False):
+    """Expander with the study-material passage a question was generated from."""
+    source = q.get("source")
+    passage = read_passage(source, q.get("chunk_hash"))
+    if not passage:
+        return
+    first, last = source["pages"]
+    pages = f"page {first}" if first == last else f"pages {first}–{last}"
+    with st.expander(f"📖 Show source passage ({pages})", expanded=expanded):
+        st.write(passage)
+        bank = load_shared_questions(st.session_state.get("bank_path"))
+        others = len(questions_on_pages(bank, source["doc_hash"], first, last)) - 1
+        if others > 0:
+            noun = "question" if others == 1 else "questions"
+            st.caption(f"{others} more {noun} in this bank come from {pages}.")
 
-    if total_questions == 0:
-        st.info("First generate questions in the Upload & Generate tab.")
-        st.stop()
+
+@st.fragment
+def quiz_view(questions):
+    """
+    Question card, progress panel and result view of the Quiz tab.
+    Answering and moving between questions reruns only this fragment;
+    switching to the result view or restarting reruns the whole app so
+    the Analytics tab is refreshed.
+    """
+    total_questions = len(questions)
 
     # -------- SESSION STATE --------
     if "quiz_index" not in st.session_state:
@@ -465,6 +723,8 @@ with tab2:
         st.session_state.quiz_score = 0
     if "quiz_history" not in st.session_state:
         st.session_state.quiz_history = []
+    if len(st.session_state.get("quiz_options", [])) != total_questions:
+        st.session_state.quiz_options = build_quiz_options(questions)
 
     # -------- END OF QUIZ (TOP LEVEL) --------
     if (
@@ -479,21 +739,24 @@ with tab2:
                 st.rerun()
         with c2:
             if st.button("🔁 Restart Quiz", use_container_width=True):
+                # A new quiz is assembled from the bank on the full rerun
+                st.session_state.pop("quiz_order", None)
+                st.session_state.pop("quiz_options", None)
                 st.session_state.quiz_index = 0
                 st.session_state.quiz_attempts = 0
                 st.session_state.quiz_start_time = time.time()
                 st.session_state.quiz_score = 0
-                st.session_state.quiz_history = []
+                reset_quiz_history()
                 st.session_state.show_result_view = False
                 st.rerun()
-        st.stop()
+        return
 
     # -------- POLISHED RESULT VIEW --------
     if st.session_state.show_result_view:
         hist = st.session_state.quiz_history
         if not hist:
             st.info("No attempts recorded yet.")
-            st.stop()
+            return
 
         acc = compute_accuracy(hist)
         avg_time = average_response_time(hist)
@@ -658,15 +921,19 @@ with tab2:
         st.markdown("<div style='height:0.8rem;'></div>", unsafe_allow_html=True)
         col_back, col_restart = st.columns(2)
         with col_back:
-            if st.button("⬅ Back to questions", use_container_width=True):
-                st.session_state.show_result_view = False
-                st.rerun()
+            st.button(
+                "⬅ Back to questions",
+                use_container_width=True,
+                on_click=close_result_view,
+            )
         with col_restart:
             if st.button("🔁 Restart this quiz", use_container_width=True):
+                st.session_state.pop("quiz_order", None)
+                st.session_state.pop("quiz_options", None)
                 st.session_state.quiz_index = 0
                 st.session_state.quiz_attempts = 0
                 st.session_state.quiz_score = 0
-                st.session_state.quiz_history = []
+                reset_quiz_history()
                 st.session_state.quiz_start_time = time.time()
                 st.session_state.show_result_view = False
                 st.rerun()
@@ -676,6 +943,13 @@ with tab2:
         idx = st.session_state.quiz_index
         q = questions[idx]
         q_num = idx + 1
+        if "first_question_at" not in st.session_state:
+            st.session_state.first_question_at = time.time()
+            instrumentation.observe(
+                "time_to_first_question.seconds",
+                st.session_state.first_question_at - st.session_state.session_started_at,
+            )
+            warmup.record_first_question()
 
         # 2) PURE HTML CANVAS
         st.markdown(
@@ -728,25 +1002,32 @@ with tab2:
                 unsafe_allow_html=True,
             )
 
-            opt_key = f"options_{idx}"
-            if opt_key not in st.session_state:
-                opts = [q["answer"]] + q.get("distractors", [])
-                opts = list(dict.fromkeys(opts))
-                random.shuffle(opts)
-                st.session_state[opt_key] = opts
-            options = st.session_state[opt_key]
+            free_text = q.get("type") in FREE_TEXT_TYPES
+            if free_text:
+                st.markdown(
+                    "<div style='font-size:0.95rem;font-weight:600;margin-bottom:0.3rem;'>"
+                    "Type your answer:</div>",
+                    unsafe_allow_html=True,
+                )
+                selected = st.text_input(
+                    "Your answer",
+                    key=f"quiz_q_{idx}",
+                    label_visibility="collapsed",
+                )
+            else:
+                options = st.session_state.quiz_options[idx]
 
-            st.markdown(
-                "<div style='font-size:0.95rem;font-weight:600;margin-bottom:0.3rem;'>"
-                "Select an answer:</div>",
-                unsafe_allow_html=True,
-            )
-            selected = st.radio(
-                "",
-                options,
-                key=f"quiz_q_{idx}",
-                label_visibility="hidden",
-            )
+                st.markdown(
+                    "<div style='font-size:0.95rem;font-weight:600;margin-bottom:0.3rem;'>"
+                    "Select an answer:</div>",
+                    unsafe_allow_html=True,
+                )
+                selected = st.radio(
+                    "",
+                    options,
+                    key=f"quiz_q_{idx}",
+                    label_visibility="hidden",
+                )
 
             submit_clicked = st.button(
                 "✅ Submit", key=f"submit_{idx}", use_container_width=False
@@ -822,11 +1103,13 @@ with tab2:
             is_last = q_num == total_questions
             col_n1, col_n2 = st.columns(2)
             with col_n1:
-                next_clicked = st.button(
+                st.button(
                     "➡ Next Question",
                     disabled=is_last,
                     use_container_width=True,
                     key=f"next_{idx}",
+                    on_click=go_to_next_question,
+                    args=(q_num,),
                 )
             with col_n2:
                 result_clicked = st.button(
@@ -847,74 +1130,117 @@ with tab2:
         )
 
         # -------- LOGIC --------
-        if submit_clicked:
+        if submit_clicked and free_text and not (selected or "").strip():
+            st.warning("Type an answer before submitting.")
+        elif submit_clicked:
             elapsed = time.time() - st.session_state.quiz_start_time
-            is_correct = selected.strip().lower() == q["answer"].strip().lower()
+            if free_text:
+                grade = grade_answer(q, selected)
+                is_correct = grade.correct
+            else:
+                is_correct = selected.strip().lower() == q["answer"].strip().lower()
 
             st.session_state.quiz_history.append(
                 {
                     "is_correct": is_correct,
                     "difficulty": q.get("difficulty"),
                     "topic": q.get("topic"),
+                    "topic_id": q.get("topic_id"),
+                    "type": q.get("type"),
+                    # Kept so attempts can be re-graded (models.grading.grade_many)
+                    "response": selected,
                     "response_time": elapsed,
                 }
             )
+            record_attempt(q, is_correct, elapsed, session_id=st.session_state.session_id)
             if is_correct:
                 st.session_state.quiz_score += 1
-                st.success("✅ Correct!")
+                if free_text and grade.score < 1.0:
+                    st.success(f"✅ Correct! Exact answer: {q['answer']}")
+                else:
+                    st.success("✅ Correct!")
             else:
                 st.error(f"❌ Incorrect. Correct answer: {q['answer']}")
+            show_source_passage(q, expanded=not is_correct)
             st.session_state.quiz_attempts += 1
 
-        if next_clicked and st.session_state.quiz_attempts >= q_num:
-            st.session_state.quiz_index += 1
-            st.session_state.quiz_start_time = time.time()
-            st.rerun()
-
         if result_clicked:
             st.session_state.show_result_view = True
             st.rerun()
 
 
 
+with tab2:
+    # -------- LOAD QUESTIONS --------
+    # Never waits for the warmup: a bank it already loaded is a cache hit,
+    # any other is parsed here. None falls back to the default bank in data/questions.json
+    quiz_bank = load_shared_questions(st.session_state.get("bank_path"))
+
+    if not quiz_bank:
+        st.info("First generate questions in the Upload & Generate tab.")
+    else:
+        # Pick this quiz's questions once, following the Target difficulty
+        if "quiz_order" not in st.session_state:
+            recent = st.session_state.get("quiz_recent", [])
+            order = assemble_quiz(quiz_bank, num_questions, difficulty_mode, recent=recent)
+            st.session_state.quiz_order = order
+            st.session_state.quiz_recent = (recent + order)[-RECENT_QUESTIONS_LIMIT:]
+        quiz_view([quiz_bank[i] for i in st.session_state.quiz_order])
+
+
 # =========================================================
 # TAB 3: ANALYTICS
 # =========================================================
 
-with tab3:
-    st.subheader("📈 Performance analytics")
-
-    hist = st.session_state.get("quiz_history", [])
-
-    if not hist:
-        st.info("Attempt the quiz first to view analytics.")
-        st.stop()
+def request_topic_questions(topic):
+    """Queue more questions on a weak topic from the current document's best-matching chunks."""
+    repeats = st.session_state.setdefault("topic_repeats", {})
+    repeats[topic] = repeats.get(topic, 0) + 1
+    job_id = submit_topic_job(
+        st.session_state.bank_doc_hash,
+        topic,
+        TOPIC_FOLLOW_UP_QUESTIONS,
+        repeat=repeats[topic],
+        session_id=st.session_state.session_id,
+    )
+    st.session_state.gen_job_id = job_id
+    st.query_params["job"] = job_id
+    ensure_worker_running()
 
-    acc = compute_accuracy(hist)
-    avg_time = average_response_time(hist)
-    score = total_score(hist)
 
-    # ----- Difficulty progression -----
-    st.subheader("Difficulty progression")
-    diff_list = difficulty_progression(hist)
-    diff_map = {"easy": 1, "medium": 2, "hard": 3}
-    diff_values = [diff_map.get(d, 2) for d in diff_list]
-    x = list(range(1, len(diff_values) + 1))
+def analytics_figures(hist):
+    """
+    Figures for the Analytics tab, rebuilt only when the quiz history changed.
+    Time series are downsampled, so the chart payload stays bounded however
+    long the history is.
+    """
+    key = (st.session_state.get("history_version", 0), len(hist))
+    cached = st.session_state.get("analytics_figures")
+    if cached is not None and cached[0] == key:
+        return cached[1]
 
+    x = np.arange(1, len(hist) + 1, dtype=np.float64)
+    diff_x, diff_y = downsample_lttb(x, difficulty_levels(hist))
     fig_diff = px.line(
-        x=x,
-        y=diff_values,
+        x=diff_x,
+        y=diff_y,
         markers=True,
         labels={
             "x": "Question #",
             "y": "Difficulty level (1 = Easy, 2 = Medium, 3 = Hard)",
         },
     )
-    st.plotly_chart(fig_diff, use_container_width=True)
 
-    # ----- Topic-wise performance + insight cards -----
-    st.subheader("Topic-wise performance")
+    acc_x, acc_y = downsample_lttb(x, rolling_accuracy(hist))
+    fig_acc = px.line(
+        x=acc_x,
+        y=acc_y,
+        labels={"x": "Question #", "y": f"Accuracy (last {ROLLING_WINDOW})"},
+        range_y=[0, 1],
+    )
+
     df_topics = topic_wise_performance(hist)
+    fig_topic = None
     if not df_topics.empty:
         fig_topic = px.bar(
             df_topics,
@@ -925,7 +1251,37 @@ with tab3:
             range_y=[0, 1],
         )
         fig_topic.update_traces(texttemplate="%{text:.0%}", textposition="outside")
-        st.plotly_chart(fig_topic, use_container_width=True)
+
+    figures = {"difficulty": fig_diff, "accuracy": fig_acc, "topics": df_topics, "topic_bar": fig_topic}
+    st.session_state.analytics_figures = (key, figures)
+    return figures
+
+
+def analytics_view(hist):
+    st.subheader("📈 Performance analytics")
+
+    if not hist:
+        st.info("Attempt the quiz first to view analytics.")
+        return
+
+    acc = compute_accuracy(hist)
+    avg_time = average_response_time(hist)
+    score = total_score(hist)
+
+    figures = analytics_figures(hist)
+
+    # ----- Difficulty progression -----
+    st.subheader("Difficulty progression")
+    st.plotly_chart(figures["difficulty"], use_container_width=True)
+
+    st.subheader("Accuracy trend")
+    st.plotly_chart(figures["accuracy"], use_container_width=True)
+
+    # ----- Topic-wise performance + insight cards -----
+    st.subheader("Topic-wise performance")
+    df_topics = figures["topics"]
+    if not df_topics.empty:
+        st.plotly_chart(figures["topic_bar"], use_container_width=True)
 
         weak = hardest_topics(df_topics)
 
@@ -992,6 +1348,18 @@ with tab3:
                     """,
                     unsafe_allow_html=True,
                 )
+                if has_chunk_index(st.session_state.get("bank_doc_hash")):
+                    generating = bool(st.session_state.get("gen_job_id"))
+                    for topic in weak:
+                        st.button(
+                            f"➕ {TOPIC_FOLLOW_UP_QUESTIONS} more questions on {topic}",
+                            key=f"more_questions_{topic}",
+                            on_click=request_topic_questions,
+                            args=(topic,),
+                            disabled=generating,
+                        )
+                    if generating:
+                        st.caption("Generating… progress is shown in the Upload & Generate tab.")
             else:
                 st.markdown(
                     """
@@ -1054,3 +1422,80 @@ with tab3:
             unsafe_allow_html=True,
         )
 
+
+def cohort_view():
+    st.subheader("👥 Class-wide analytics")
+    summary = cohort_summary()
+    if not summary["attempts"]:
+        st.info("No attempts recorded yet.")
+        return
+
+    col_a, col_b, col_c = st.columns(3)
+    col_a.metric("Attempts", f"{summary['attempts']:,}")
+    col_b.metric("Accuracy", f"{summary['accuracy']*100:.0f}%")
+    col_c.metric("Avg. response time", f"{summary['avg_response_time']:.1f}s")
+
+    st.subheader("Topic accuracy over time")
+    df_days = pd.DataFrame(topic_accuracy_over_time())
+    fig_days = px.line(
+        df_days,
+        x="day",
+        y="accuracy",
+        color="topic",
+        markers=True,
+        labels={"day": "Day", "accuracy": "Accuracy", "topic": "Topic"},
+        range_y=[0, 1],
+    )
+    st.plotly_chart(fig_days, use_container_width=True)
+
+    st.subheader("Response times")
+    fig_times = px.bar(
+        pd.DataFrame(response_time_distribution()),
+        x="bucket",
+        y="attempts",
+        labels={"bucket": "Response time", "attempts": "Attempts"},
+    )
+    st.plotly_chart(fig_times, use_container_width=True)
+
+    st.subheader("Hardest questions")
+    df_questions = pd.DataFrame(question_stats(min_attempts=COHORT_MIN_ATTEMPTS, limit=20))
+    if df_questions.empty:
+        st.caption(f"Questions show up here once they have {COHORT_MIN_ATTEMPTS} attempts.")
+    else:
+        st.dataframe(
+            df_questions[["question", "topic", "difficulty", "attempts", "p_value", "avg_response_time"]],
+            column_config={
+                "p_value": st.column_config.NumberColumn("p-value", format="%.2f"),
+                "avg_response_time": st.column_config.NumberColumn("Avg. time (s)", format="%.1f"),
+            },
+            hide_index=True,
+            use_container_width=True,
+        )
+
+
+with tab3:
+    if st.radio("View", ["My session", "Class-wide"], horizontal=True, key="analytics_scope") == "Class-wide":
+        cohort_view()
+    else:
+        analytics_view(st.session_state.get("quiz_history", []))
+
+
+# -------------------- DEBUG METRICS --------------------
+
+if instrumentation.enabled():
+    with st.expander("🛠 Debug: pipeline metrics"):
+        st.caption("Generation runs in the worker process; its metrics are flushed after every job.")
+        for source, snapshot in instrumentation.latest_snapshots().items():
+            st.markdown(f"**{source}**")
+            render_metrics_summary(snapshot)
+        st.markdown("**app (this process)**")
+        render_metrics_summary(instrumentation.metrics.summary())
+        st.markdown("**warmup**")
+        st.json(
+            {
+                "ready": warmup.ready.is_set(),
+                "steps_seconds": {name: round(sec, 3) for name, sec in warmup.steps.items()},
+                "time_to_first_question_seconds": warmup.first_question_seconds,
+                "error": warmup.error,
+            }
+        )
@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+# Canned questions cycled through by the fake client. They pass validation,
+# so the downstream stages see a realistic amount of work.
+CANNED_QUESTIONS: List[Dict] = [
+    {
+        "question": "Who proposed the theory of natural selection?",
+        "answer": "Charles Darwin",
+        "distractors": ["Gregor Mendel", "Louis Pasteur", "Isaac Newton"],
+        "difficulty": "easy",
+        "topic": "Evolution",
+        "type": "mcq",
+    },
+    {
+        "question": "When did the Great Oxidation Event begin?",
+        "answer": "2.4 billion years ago",
+        "distractors": ["1.8 billion years ago", "3.5 billion years ago", "4.5 billion years ago"],
+        "difficulty": "medium",
+        "topic": "Photosynthesis",
+        "type": "mcq",
+    },
+    {
+        "question": "Where does the light-dependent reaction take place?",
+        "answer": "Thylakoid membrane",
+        "distractors": ["Stroma", "Mitochondrial matrix", "Cell wall"],
+        "difficulty": "medium",
+        "topic": "Photosynthesis",
+        "type": "mcq",
+    },
+    {
+        "question": "What molecule carries genetic information in most organisms?",
+        "answer": "DNA",
+        "distractors": ["ATP", "Glucose", "Chlorophyll"],
+        "difficulty": "easy",
+        "topic": "Genetics",
+        "type": "short_answer",
+    },
+    {
+        "question": "Which organelle produces most of a cell's ATP?",
+        "answer": "Mitochondrion",
+        "distractors": ["Ribosome", "Golgi apparatus", "Lysosome"],
+        "difficulty": "hard",
+        "topic": "Cell Biology",
+        "type": "mcq",
+    },
+]
+
+
+class FakeInferenceClient:
+    """
+    Deterministic stand-in for huggingface_hub.InferenceClient.
+    Every chat completion sleeps for `latency` seconds and returns
+    `questions_per_call` canned questions as a JSON array.
+    """
+
+    def __init__(self, latency: float = 0.0, questions_per_call: int = 2):
+        self.latency = latency
+        self.questions_per_call = questions_per_call
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=None, max_tokens=512, temperature=0.7, **kwargs):
+        with self._lock:
+            call = self.calls
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        items = [
+            CANNED_QUESTIONS[(call + i) % len(CANNED_QUESTIONS)]
+            for i in range(self.questions_per_call)
+        ]
+        content = json.dumps(items)
+        prompt_chars = sum(len(m.get("content", "")) for m in messages or [])
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_chars // 4,
+            completion_tokens=len(content) // 4,
+            total_tokens=prompt_chars // 4 + len(content) // 4,
+        )
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
@@ -0,0 +1,346 @@
+"""
+Load test: concurrent simulated quiz takers against one app process.
+
+    python -m benchmarks.load_test                          # 1, 5, 10 and 20 sessions
+    python -m benchmarks.load_test --sessions 10 40 --latency-ms 200
+    python -m benchmarks.load_test --distinct-docs          # one PDF per session
+
+Every session is a Streamlit AppTest of app.py running in this process, the
+way real sessions share one server process. AppTest swaps a process-wide
+mock runtime in for each run, so script runs take turns under a lock and
+the time spent waiting for it counts towards latency. Under the GIL,
+CPU-bound reruns behave much the same way on a real server; overlapping
+I/O is not modelled. Generation and warmup run outside the lock. A session opens the app,
+uploads a synthetic PDF and generates a bank, answers every question, and
+opens both analytics views. Generation runs on a worker thread in this
+process against the fake InferenceClient, so no LLM is called.
+
+For each concurrency level the report gives latency percentiles per
+interaction, throughput, and resident memory growth per session. The
+capacity line is the largest level whose p95 latency over all interactions
+stays within --slo-ms. As with benchmarks.run, numbers are machine-specific.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.fake_llm import FakeInferenceClient
+from benchmarks.synthetic_pdf import make_synthetic_pdf
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_PATH = BENCH_DIR.parent / "app.py"
+RESULTS_PATH = BENCH_DIR / "load_results.json"
+
+DEFAULT_SESSIONS = [1, 5, 10, 20]
+DEFAULT_PAGES = 5
+DEFAULT_QUESTIONS = 5
+DEFAULT_SLO_MS = 1000.0
+# Seconds a session waits for its generation job before giving up
+GENERATION_TIMEOUT = 300.0
+GENERATION_POLL = 0.2
+SCRIPT_TIMEOUT = 120.0
+
+PAGE_LOAD = "page_load"
+GENERATE_CLICK = "generate_click"
+GENERATION_WAIT = "generation_wait"
+FIRST_QUESTION = "time_to_first_question"
+ANSWER = "answer"
+NEXT_QUESTION = "next_question"
+ANALYTICS = "analytics"
+COHORT_ANALYTICS = "cohort_analytics"
+# Reruns a user waits on; generation_wait and time_to_first_question are
+# end-to-end times and are reported but left out of the SLO
+INTERACTIONS = (PAGE_LOAD, GENERATE_CLICK, ANSWER, NEXT_QUESTION, ANALYTICS, COHORT_ANALYTICS)
+
+
+def rss_bytes() -> int:
+    """Current resident set size; peak RSS where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _percentiles(values: List[float]) -> Dict:
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pct(50) * 1000, 1),
+        "p95_ms": round(pct(95) * 1000, 1),
+        "p99_ms": round(pct(99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 1),
+    }
+
+
+# One script run at a time; see the module docstring
+_script_lock = threading.Lock()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: List[str] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.latencies[name].append(seconds)
+
+    def timed_run(self, name: str, at):
+        start = time.perf_counter()
+        with _script_lock:
+            at.run()
+        self.add(name, time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+        return at
+
+    def fail(self, message: str):
+        with self._lock:
+            self.errors.append(message)
+
+
+def _button(at, label: str):
+    for button in at.button:
+        if label in (button.label or "") and not button.disabled:
+            return button
+    return None
+
+
+def simulate_session(pdf: bytes, filename: str, num_questions: int, recorder: Recorder):
+    """One user: open, generate, take the whole quiz, look at both analytics views."""
+    from streamlit.testing.v1 import AppTest
+
+    opened = time.perf_counter()
+    at = AppTest.from_file(str(APP_PATH), default_timeout=SCRIPT_TIMEOUT)
+    recorder.timed_run(PAGE_LOAD, at)
+
+    at.file_uploader[0].upload(filename, pdf, "application/pdf")
+    at.slider[0].set_value(num_questions)
+    _button(at, "Extract & Generate").click()
+    recorder.timed_run(GENERATE_CLICK, at)
+
+    submitted = time.perf_counter()
+    while not any("Generated" in s.value for s in at.success):
+        if at.error:
+            raise RuntimeError(f"generation: {at.error[0].value}")
+        if time.perf_counter() - submitted > GENERATION_TIMEOUT:
+            raise TimeoutError("generation did not finish")
+        time.sleep(GENERATION_POLL)
+        with _script_lock:
+            at.run()
+    recorder.add(GENERATION_WAIT, time.perf_counter() - submitted)
+
+    first = True
+    while True:
+        radios = [r for r in at.radio if (r.key or "").startswith("quiz_q_")]
+        inputs = [t for t in at.text_input if (t.key or "").startswith("quiz_q_")]
+        if first and (radios or inputs):
+            recorder.add(FIRST_QUESTION, time.perf_counter() - opened)
+            first = False
+        if radios:
+            radios[0].set_value(radios[0].options[0])
+        elif inputs:
+            inputs[0].input("answer")
+        else:
+            break
+        submit = [b for b in at.button if (b.key or "").startswith("submit_")]
+        if not submit:
+            break
+        submit[0].click()
+        recorder.timed_run(ANSWER, at)
+        next_button = _button(at, "Next Question")
+        if next_button is None:
+            break
+        next_button.click()
+        recorder.timed_run(NEXT_QUESTION, at)
+
+    recorder.timed_run(ANALYTICS, at)
+    at.radio(key="analytics_scope").set_value("Class-wide")
+    recorder.timed_run(COHORT_ANALYTICS, at)
+    return at
+
+
+def _handouts(workdir: Path, count: int, pages: int, first_seed: int) -> List[Tuple[str, bytes]]:
+    """(file name, PDF bytes) of synthetic handouts; distinct names, so none is taken for a revision of another."""
+    handouts = []
+    for seed in range(first_seed, first_seed + count):
+        path = make_synthetic_pdf(workdir / f"handout_{seed}.pdf", pages, seed=seed)
+        handouts.append((path.name, path.read_bytes()))
+    return handouts
+
+
+def run_level(sessions: int, handouts: List[Tuple[str, bytes]], num_questions: int, ramp: float) -> Dict:
+    recorder = Recorder()
+    apps = []
+    rss_before = rss_bytes()
+
+    def session(i: int):
+        time.sleep(ramp * i / max(1, sessions))
+        try:
+            filename, pdf = handouts[i % len(handouts)]
+            apps.append(simulate_session(pdf, filename, num_questions, recorder))
+        except Exception as exc:
+            recorder.fail(f"session {i}: {exc!r}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="session") as pool:
+        list(pool.map(session, range(sessions)))
+    wall = time.perf_counter() - start
+    # Measured while the finished sessions are still referenced, like live ones
+    rss_after = rss_bytes()
+
+    interactions = sum(len(recorder.latencies[name]) for name in INTERACTIONS)
+    overall = [v for name in INTERACTIONS for v in recorder.latencies[name]]
+    result = {
+        "sessions": sessions,
+        "completed": len(apps),
+        "errors": recorder.errors,
+        "wall_seconds": round(wall, 3),
+        "throughput": {
+            "interactions_per_second": round(interactions / wall, 2),
+            "sessions_per_minute": round(len(apps) / wall * 60, 2),
+        },
+        "memory": {
+            "rss_before_mb": round(rss_before / 2**20, 1),
+            "rss_after_mb": round(rss_after / 2**20, 1),
+            "growth_per_session_kb": round((rss_after - rss_before) / max(1, sessions) / 1024, 1),
+        },
+        "latency": {name: _percentiles(values) for name, values in recorder.latencies.items() if values},
+        "overall": _percentiles(overall) if overall else None,
+    }
+    del apps
+    return result
+
+
+def run_load_test(
+    levels: List[int],
+    pages: int,
+    num_questions: int,
+    latency: float,
+    ramp: float,
+    distinct_docs: bool,
+    workdir: Path,
+) -> Dict:
+    # BASE_DIR is relative, so the app's data/ lives in the scratch directory
+    os.chdir(workdir)
+    import models.question_generator as qg
+    from services.jobs import run_worker
+
+    qg.client = FakeInferenceClient(latency=latency)
+    # The app sees this worker as alive and does not start a process of its own
+    threading.Thread(target=run_worker, kwargs={"poll_interval": 0.05}, name="worker", daemon=True).start()
+
+    # Not measured: loads the app's modules and caches the way a running server has them
+    print("[load] warm-up session", file=sys.stderr)
+    run_level(1, _handouts(workdir, 1, pages, first_seed=0), num_questions, 0.0)
+
+    results = {
+        "meta": {
+            "pages": pages,
+            "num_questions": num_questions,
+            "latency_seconds": latency,
+            "distinct_docs": distinct_docs,
+            "cpus": os.cpu_count(),
+        },
+        "levels": [],
+    }
+    seed = 1
+    for sessions in levels:
+        print(f"[load] {sessions} concurrent sessions", file=sys.stderr)
+        # New handouts per level, so every level pays for its own generation
+        documents = sessions if distinct_docs else 1
+        handouts = _handouts(workdir, documents, pages, first_seed=seed)
+        seed += documents
+        results["levels"].append(run_level(sessions, handouts, num_questions, ramp))
+    return results
+
+
+def capacity(results: Dict, slo_ms: float) -> int:
+    """Largest level with no failed session and overall p95 within the SLO; 0 if none."""
+    best = 0
+    for level in results["levels"]:
+        overall = level["overall"]
+        if level["errors"] or overall is None or overall["p95_ms"] > slo_ms:
+            break
+        best = level["sessions"]
+    return best
+
+
+def print_report(results: Dict, slo_ms: float):
+    print(f"{'sessions':>8} {'done':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'int/s':>7} {'KB/session':>11}")
+    for level in results["levels"]:
+        overall = level["overall"] or {}
+        print(
+            f"{level['sessions']:>8} {level['completed']:>5} {overall.get('p50_ms', 0):>8} "
+            f"{overall.get('p95_ms', 0):>8} {overall.get('p99_ms', 0):>8} "
+            f"{level['throughput']['interactions_per_second']:>7} "
+            f"{level['memory']['growth_per_session_kb']:>11}"
+        )
+        for message in level["errors"][:3]:
+            print(f"         ERROR {message}")
+    last = results["levels"][-1]
+    print("\nPer interaction at the highest level (p50 / p95 ms):")
+    for name, stats in last["latency"].items():
+        print(f"  {name:<24} {stats['p50_ms']:>8} / {stats['p95_ms']:<8} (n={stats['count']})")
+    print(f"\nCapacity: {capacity(results, slo_ms)} concurrent sessions with p95 <= {slo_ms:.0f} ms")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS, help="concurrency levels")
+    parser.add_argument("--pages", type=int, default=DEFAULT_PAGES, help="pages per synthetic PDF")
+    parser.add_argument("--questions", type=int, default=DEFAULT_QUESTIONS, help="quiz length (3-20)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake LLM latency per call")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which sessions start")
+    parser.add_argument("--distinct-docs", action="store_true", help="one PDF per session instead of a shared one")
+    parser.add_argument("--slo-ms", type=float, default=DEFAULT_SLO_MS)
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    args = parser.parse_args(argv)
+
+    output = args.output.resolve()
+    # AppTest logs a warning with a stack trace for every label-less widget
+    # and deprecated argument; disabled loggers stay quiet when it reloads config
+    for name in ("streamlit.elements.lib.policies", "streamlit.deprecation_util"):
+        logging.getLogger(name).disabled = True
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        try:
+            results = run_load_test(
+                sorted(args.sessions),
+                args.pages,
+                args.questions,
+                args.latency_ms / 1000.0,
+                args.ramp,
+                args.distinct_docs,
+                Path(tmp),
+            )
+        finally:
+            os.chdir(cwd)
+    results["capacity"] = {"slo_p95_ms": args.slo_ms, "sessions": capacity(results, args.slo_ms)}
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print_report(results, args.slo_ms)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
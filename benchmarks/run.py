@@ -0,0 +1,267 @@
+"""
+End-to-end pipeline benchmarks with a fake LLM and synthetic PDFs.
+
+    python -m benchmarks.run                       # all sizes, compare with baseline
+    python -m benchmarks.run --sizes 10 100        # quicker run
+    python -m benchmarks.run --update-baseline     # record a new baseline
+
+Timings are machine-specific: record a baseline on the machine that runs
+the comparison. The exit code is 1 when a stage regressed.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.fake_llm import CANNED_QUESTIONS, FakeInferenceClient
+from benchmarks.synthetic_pdf import make_synthetic_pdf
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+RESULTS_PATH = BENCH_DIR / "results.json"
+
+DEFAULT_SIZES = [10, 100, 1000]
+QUESTIONS_PER_PAGE = 10
+# pdfplumber takes seconds per hundred pages, so run-to-run noise is small
+# compared to the stage itself; one run keeps the 1,000-page case practical
+EXTRACT_REPEAT = 1
+ATTEMPTS_PER_PAGE = 10
+
+# A stage regresses when it is this much slower than baseline ...
+DEFAULT_TOLERANCE = 0.25
+# ... and the absolute slowdown is above this noise floor (seconds)
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def _time(fn: Callable, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return {"seconds": statistics.median(timings), "runs": repeat}, result
+
+
+def _synthetic_history(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    topics = sorted({q["topic"] for q in CANNED_QUESTIONS})
+    return [
+        {
+            "is_correct": rng.random() < 0.6,
+            "difficulty": rng.choice(["easy", "medium", "hard"]),
+            "topic": rng.choice(topics),
+            "response_time": rng.uniform(2.0, 40.0),
+        }
+        for _ in range(n)
+    ]
+
+
+def run_benchmarks(sizes: List[int], latency: float, repeat: int, workdir: Path) -> Dict:
+    import models.question_generator as qg
+    from models.question_generator import (
+        generate_questions_from_chunks,
+        generate_questions_from_text,
+        clean_questions,
+    )
+    from models.quiz_assembler import assemble_quiz, build_index
+    from services import analytics
+    from services.bank_format import save_bank, load_bank
+    from services.retrieval import ChunkIndex
+    from services.storage import save_questions_json, load_questions_json
+    from utils.boilerplate import strip_boilerplate
+    from utils.text_extraction import (
+        extract_pages_from_pdf,
+        clean_text,
+        content_hash,
+        split_into_chunks,
+        split_pages_into_chunks,
+    )
+
+    fake_client = FakeInferenceClient(latency=latency)
+    qg.client = fake_client
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency_seconds": latency,
+            "repeat": repeat,
+        },
+        "stages": {},
+    }
+
+    for pages in sizes:
+        print(f"[bench] {pages} pages", file=sys.stderr)
+        pdf_path = make_synthetic_pdf(workdir / f"synthetic_{pages}.pdf", pages)
+        stages: Dict[str, Dict] = {}
+
+        # Kept under its old name so earlier baselines still compare
+        stages["extract_text_from_pdf"], raw_pages = _time(
+            lambda: extract_pages_from_pdf(str(pdf_path)), EXTRACT_REPEAT
+        )
+        stages["strip_boilerplate"], (page_texts, stripped) = _time(
+            lambda: strip_boilerplate(raw_pages, drop_toc=True, drop_index=True), repeat
+        )
+        stages["clean_text"], text = _time(lambda: clean_text("\n".join(page_texts)), repeat)
+        stages["split_into_chunks"], chunks = _time(lambda: split_into_chunks(text), repeat)
+        stages["split_pages_into_chunks"], page_chunks = _time(
+            lambda: split_pages_into_chunks(page_texts), repeat
+        )
+
+        calls_before = fake_client.calls
+        stages["generate_questions_from_text"], generated = _time(
+            lambda: generate_questions_from_text(text, num_questions=20), repeat
+        )
+        stages["generate_questions_from_text"]["llm_calls"] = (
+            fake_client.calls - calls_before
+        ) // repeat
+        stages["generate_questions_from_text"]["questions"] = len(generated)
+
+        stages["build_chunk_index"], chunk_index = _time(lambda: ChunkIndex.from_chunks(chunks), repeat)
+        calls_before = fake_client.calls
+        stages["topic_questions"], generated = _time(
+            lambda: generate_questions_from_chunks(
+                chunk_index.top_chunks("Photosynthesis", 3), num_questions=10, focus_topic="Photosynthesis"
+            ),
+            repeat,
+        )
+        stages["topic_questions"]["llm_calls"] = (fake_client.calls - calls_before) // repeat
+        stages["topic_questions"]["questions"] = len(generated)
+
+        # A revised upload with one page edited only regenerates the chunks around it
+        revised_pages = list(page_texts)
+        revised_pages[len(revised_pages) // 2] += " Revised paragraph added this week."
+        old_hashes = {content_hash(c) for c in page_chunks}
+
+        def revise_one_page():
+            revised = split_pages_into_chunks(revised_pages)
+            changed = [c for c in revised if content_hash(c) not in old_hashes]
+            return generate_questions_from_chunks(changed, num_questions=2 * len(changed))
+
+        calls_before = fake_client.calls
+        stages["revise_one_page"], generated = _time(revise_one_page, repeat)
+        stages["revise_one_page"]["llm_calls"] = (fake_client.calls - calls_before) // repeat
+
+        bank = [dict(CANNED_QUESTIONS[i % len(CANNED_QUESTIONS)]) for i in range(pages * QUESTIONS_PER_PAGE)]
+        stages["clean_questions"], _ = _time(
+            lambda: clean_questions([dict(q) for q in bank]), repeat
+        )
+
+        bank_path = workdir / f"bank_{pages}.json"
+        stages["save_questions_json"], _ = _time(lambda: save_questions_json(bank, bank_path), repeat)
+        stages["load_questions_json"], _ = _time(lambda: load_questions_json(bank_path), repeat)
+
+        arrow_path = workdir / f"bank_{pages}.arrow"
+        stages["save_bank"], _ = _time(lambda: save_bank(bank, arrow_path), repeat)
+        stages["load_bank"], loaded = _time(lambda: load_bank(arrow_path), repeat)
+        stages["filter_bank"], _ = _time(
+            lambda: loaded.indices(difficulty="easy", topic=["Evolution", "Genetics"]), repeat
+        )
+        stages["index_bank"], _ = _time(lambda: build_index(bank), repeat)
+        shared_bank = tuple(bank)
+        assemble_quiz(shared_bank, 20)  # builds the cached index
+        stages["assemble_quiz"], _ = _time(
+            lambda: assemble_quiz(shared_bank, 20, "Mostly hard", recent=range(20)), repeat
+        )
+
+        history = _synthetic_history(pages * ATTEMPTS_PER_PAGE)
+
+        def run_analytics():
+            analytics.compute_accuracy(history)
+            analytics.average_response_time(history)
+            analytics.total_score(history)
+            # The chart series the Analytics tab draws
+            x = np.arange(1, len(history) + 1, dtype=np.float64)
+            analytics.downsample_lttb(x, analytics.difficulty_levels(history))
+            analytics.downsample_lttb(x, analytics.rolling_accuracy(history))
+            df = analytics.topic_wise_performance(history)
+            analytics.hardest_topics(df)
+            analytics.generate_recommendation(history)
+
+        stages["analytics"], _ = _time(run_analytics, repeat)
+
+        for name, stage in stages.items():
+            stage["seconds"] = round(stage["seconds"], 6)
+        stages["meta"] = {
+            "chunks": len(chunks),
+            "words": len(text.split()),
+            "tokens_saved": stripped.get("tokens_saved", 0),
+        }
+        results["stages"][str(pages)] = stages
+
+    return results
+
+
+def compare_with_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return one message per stage that regressed against the baseline."""
+    regressions = []
+    for size, stages in results["stages"].items():
+        base_stages = baseline.get("stages", {}).get(size, {})
+        for name, stage in stages.items():
+            base = base_stages.get(name)
+            if name == "meta" or not base:
+                continue
+            new_s, base_s = stage["seconds"], base["seconds"]
+            if new_s > base_s * (1 + tolerance) and new_s - base_s > MIN_REGRESSION_SECONDS:
+                regressions.append(
+                    f"{size} pages / {name}: {base_s:.4f}s -> {new_s:.4f}s "
+                    f"(+{(new_s / base_s - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def print_table(results: Dict, baseline: Dict):
+    print(f"{'pages':>6}  {'stage':<30} {'seconds':>10} {'baseline':>10}")
+    for size, stages in results["stages"].items():
+        base_stages = baseline.get("stages", {}).get(size, {})
+        for name, stage in stages.items():
+            if name == "meta":
+                continue
+            base = base_stages.get(name, {}).get("seconds")
+            base_txt = f"{base:10.4f}" if base is not None else f"{'-':>10}"
+            print(f"{size:>6}  {name:<30} {stage['seconds']:10.4f} {base_txt}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="PDF sizes in pages")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake LLM latency per call")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage (median is reported)")
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_benchmarks(args.sizes, args.latency_ms / 1000.0, args.repeat, Path(tmp))
+
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    print_table(results, baseline)
+
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    for message in regressions:
+        print("REGRESSION:", message)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import random
+from pathlib import Path
+from typing import List
+
+_WORDS = (
+    "photosynthesis chlorophyll energy light carbon dioxide oxygen glucose plant cell "
+    "membrane enzyme reaction molecule protein structure function evolution species "
+    "population gene inheritance variation adaptation environment ecosystem nutrient "
+    "water transport respiration mitochondria nucleus division growth organism"
+).split()
+_NAMES = ["Charles Darwin", "Gregor Mendel", "Marie Curie", "Louis Pasteur", "Rosalind Franklin"]
+_PLACES = ["Cambridge", "Paris", "Vienna", "London", "Galapagos"]
+
+LINES_PER_PAGE = 40
+WORDS_PER_LINE = 9
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def synthetic_page_lines(page_no: int, rng: random.Random) -> List[str]:
+    """One page of textbook-like text with a running header and a page-number footer."""
+    lines = ["Introduction to Biology - Chapter %d" % (page_no // 20 + 1)]
+    for _ in range(LINES_PER_PAGE):
+        words = rng.choices(_WORDS, k=WORDS_PER_LINE)
+        if rng.random() < 0.2:
+            words.insert(rng.randrange(len(words)), rng.choice(_NAMES))
+        if rng.random() < 0.15:
+            words.append("in %d" % rng.randint(1850, 1990))
+        if rng.random() < 0.1:
+            words.append("near " + rng.choice(_PLACES))
+        lines.append(" ".join(words).capitalize() + ".")
+    lines.append("Page %d" % (page_no + 1))
+    return lines
+
+
+def write_pdf(path: Path, pages: List[List[str]]):
+    """Write a minimal valid PDF with one Helvetica text stream per page."""
+    objects: List[bytes] = []
+    pages_obj = 2 + 2 * len(pages)  # font object, then (content, page) pairs
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    kids = []
+    for lines in pages:
+        ops = ["BT /F1 10 Tf 13 TL 60 770 Td"]
+        ops.extend("(%s) Tj T*" % _escape(line) for line in lines)
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_obj = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Contents %d 0 R /Resources << /Font << /F1 1 0 R >> >> >>"
+            % (pages_obj, content_obj)
+        )
+        kids.append(len(objects))
+
+    objects.append(
+        b"<< /Type /Pages /Kids [%s] /Count %d >>"
+        % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    )
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        len(objects),
+        xref,
+    )
+    Path(path).write_bytes(bytes(out))
+
+
+def make_synthetic_pdf(path: Path, num_pages: int, seed: int = 0) -> Path:
+    rng = random.Random(seed)
+    write_pdf(path, [synthetic_page_lines(i, rng) for i in range(num_pages)])
+    return Path(path)
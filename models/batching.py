@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional, Tuple
+
+# Maximum number of prompts sent to the backend in one batch
+BATCH_MAX_SIZE = int(os.environ.get("SMARTQUIZZER_BATCH_SIZE", "8"))
+
+# How long the scheduler waits for more prompts before running a partial batch
+BATCH_MAX_WAIT_MS = float(os.environ.get("SMARTQUIZZER_BATCH_WAIT_MS", "5"))
+
+# Remote requests in flight at once
+REMOTE_MAX_IN_FLIGHT = int(os.environ.get("SMARTQUIZZER_REMOTE_CONCURRENCY", "16"))
+
+# A batch runner receives prompts that share max_tokens/temperature and returns
+# one result per prompt. An item may be an Exception to fail only that prompt.
+BatchRunner = Callable[[List[str], int, float], List[object]]
+
+
+class PromptBatcher:
+    """
+    Micro-batching scheduler in front of the LLM call path.
+
+    Prompts submitted from any thread (e.g. concurrent Streamlit sessions) are
+    collected for up to `max_wait_ms`, grouped by generation settings and run
+    as one batch. Each caller gets its result back through a Future.
+    """
+
+    def __init__(
+        self,
+        run_batch: BatchRunner,
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self._pending: List[Tuple[str, int, float, Future]] = []
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((prompt, max_tokens, temperature, future))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._loop, name="prompt-batcher", daemon=True
+                )
+                self._worker.start()
+            self._cond.notify()
+        return future
+
+    def _next_batch(self) -> List[Tuple[str, int, float, Future]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            # Give other sessions a short window to join this batch
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size :]
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+
+            # Prompts can only share a forward pass if they share settings
+            groups = {}
+            for item in batch:
+                if item[3].set_running_or_notify_cancel():
+                    groups.setdefault((item[1], item[2]), []).append(item)
+
+            for (max_tokens, temperature), items in groups.items():
+                self._dispatch(items, max_tokens, temperature)
+
+    def _dispatch(self, items, max_tokens: int, temperature: float):
+        prompts = [item[0] for item in items]
+        try:
+            results = self.run_batch(prompts, max_tokens, temperature)
+        except Exception as exc:
+            results = [exc] * len(items)
+
+        if len(results) != len(items):
+            error = RuntimeError("Batch runner returned a wrong number of results")
+            results = [error] * len(items)
+
+        for item, result in zip(items, results):
+            if isinstance(result, Exception):
+                item[3].set_exception(result)
+            else:
+                item[3].set_result(result)
+
+
+# A request runner sends one prompt and returns its result
+RequestRunner = Callable[[str, int, float], object]
+
+
+class RequestScheduler:
+    """
+    Scheduler for a backend that takes one prompt per request (the remote
+    API), so there is nothing to gain from batching.
+
+    Up to `max_in_flight` requests run at once and each caller's Future is
+    resolved as soon as its own request finishes. Waiting prompts are queued
+    per submitting thread and started round-robin, so a document that
+    submits all of its chunks at once does not hold back other sessions.
+    """
+
+    def __init__(self, run_one: RequestRunner, max_in_flight: int = REMOTE_MAX_IN_FLIGHT):
+        self.run_one = run_one
+        self.max_in_flight = max(1, max_in_flight)
+        self._queues: "OrderedDict[int, Deque[Tuple[str, int, float, Future]]]" = OrderedDict()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix="llm-remote"
+        )
+
+    def submit(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7) -> Future:
+        future: Future = Future()
+        with self._lock:
+            queue = self._queues.setdefault(threading.get_ident(), deque())
+            queue.append((prompt, max_tokens, temperature, future))
+            self._start_ready()
+        return future
+
+    def _start_ready(self):
+        # Called with self._lock held
+        while self._in_flight < self.max_in_flight and self._queues:
+            key, queue = next(iter(self._queues.items()))
+            item = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            # Cancelled while waiting, e.g. when the budget ran out
+            if not item[3].set_running_or_notify_cancel():
+                continue
+            self._in_flight += 1
+            self._pool.submit(self._run, item)
+
+    def _run(self, item: Tuple[str, int, float, Future]):
+        prompt, max_tokens, temperature, future = item
+        try:
+            future.set_result(self.run_one(prompt, max_tokens, temperature))
+        except Exception as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._start_ready()
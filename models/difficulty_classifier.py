@@ -4,6 +4,7 @@ from typing import Dict
 from huggingface_hub import InferenceClient
 
 from utils.prompts import DIFFICULTY_CLASS_PROMPT
+from services.usage import CALL_DIFFICULTY, check_budget, record_usage
 
 # Read token from environment: first HUGGINGFACEHUB_API_TOKEN, otherwise HF_TOKEN
 HF_TOKEN = os.environ.get("HUGGINGFACEHUB_API_TOKEN") or os.environ.get("HF_TOKEN")
@@ -19,6 +20,7 @@ def classify_question_difficulty(question_item: Dict) -> str:
     """
     prompt = DIFFICULTY_CLASS_PROMPT.format(question=question_item["question"])
 
+    check_budget()
     completion = client.chat.completions.create(
         model=MODEL_NAME,
         messages=[
@@ -28,6 +30,13 @@ def classify_question_difficulty(question_item: Dict) -> str:
         max_tokens=5,
         temperature=0.0,
     )
+    usage = getattr(completion, "usage", None)
+    record_usage(
+        CALL_DIFFICULTY,
+        getattr(usage, "prompt_tokens", 0) or 0,
+        getattr(usage, "completion_tokens", 0) or 0,
+        MODEL_NAME,
+    )
     text = completion.choices[0].message.content
     label = text.strip().lower()
 
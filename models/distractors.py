@@ -0,0 +1,338 @@
+"""
+Local distractor engine.
+
+TermIndex scans a document once for candidate terms and buckets
+them by kind: people (capitalised multi-word names), places (capitalised
+words after in/at/near/from), years, numbers, other proper nouns and
+frequent noun phrases. A word the document also uses in lower case is a
+common noun wherever it is capitalised, so "Event" or "Species" never
+counts as a name. fill_distractors() then gives a question distractors
+of the same kind as its answer (people for "who", years for "when", places
+for "where"), replacing LLM distractors of the wrong kind and topping the
+list up to three without another LLM call. The document is only indexed
+when some question needs distractors from it.
+"""
+import random
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+from utils.instrumentation import incr
+
+NUM_DISTRACTORS = 3
+# Most frequent candidates kept per bucket
+MAX_TERMS_PER_BUCKET = 300
+
+KIND_PERSON = "person"
+KIND_PLACE = "place"
+KIND_YEAR = "year"
+KIND_NUMBER = "number"
+KIND_BOOLEAN = "boolean"
+KIND_PROPER = "proper"
+KIND_TERM = "term"
+# Lower-case words of the document, to tell common nouns from names
+_COMMON = "common"
+
+# Words of named places, events and bodies rather than people
+_NOT_NAME_WORDS = frozenset(
+    """age army bay cape cave church city coast college company council cycle desert
+    east empire era event great gulf island islands kingdom lake law league mount
+    mountains national north ocean park party period project republic revolution river
+    sea society south state states theory treaty union united university valley war west""".split()
+)
+
+_STOPWORDS = frozenset(
+    """a an and are as at be been but by can did do does for from had has have he her his
+    how if in into is it its may more most not of on or our she so such than that the their
+    them then there these they this those to was we were what when where which while who
+    why will with would you your also each other some many much very about after before
+    between during under over through used using called known""".split()
+)
+_CAPS = r"[A-Z][a-zA-Z'\-]+"
+_NAME = re.compile(rf"\b{_CAPS}(?:\s+{_CAPS}){{1,2}}\b")
+_PLACE = re.compile(rf"\b(?:in|at|near|from)\s+({_CAPS}(?:\s+{_CAPS})?)\b")
+# Capitalised words inside a sentence, and acronyms
+_PROPER = re.compile(rf"\b(?=[A-Z])(?:(?<=[a-z,;] ){_CAPS}\b|[A-Z]{{2,6}}\b)")
+_THE_BEFORE = re.compile(r"\bthe\s+$", re.IGNORECASE)
+_CAPS_NEIGHBOUR_BEFORE = re.compile(rf"\b{_CAPS}\s+$")
+_CAPS_NEIGHBOUR_AFTER = re.compile(rf"\s+{_CAPS}")
+_YEAR = re.compile(r"\b(1[0-9]{3}|20[0-9]{2})\b")
+_NUMBER = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?")
+# An answer whose core is a number: it starts with one ("2.4 billion years
+# ago", "about 37 °C", "$5 million"), not "Vitamin B12" or "Apollo 11"
+_NUMERIC_ANSWER = re.compile(
+    r"(?:(?:about|around|approximately|roughly|nearly|almost|over|under|"
+    r"more than|less than|up to)\s+)?[~$€£]?\d[\d,]*(?:\.\d+)?(?![A-Za-z])",
+    re.IGNORECASE,
+)
+# Words allowed in a numeric answer, counting the number
+MAX_NUMERIC_ANSWER_WORDS = 6
+_WORD = re.compile(r"[a-z][a-z\-]{3,}")
+# Words written in lower case somewhere in the original text
+_LOWER_WORD = re.compile(r"(?<![A-Za-z])[a-z][a-z\-]+")
+
+
+class TermIndex:
+    """Candidate distractor terms of a document, indexed on first use."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self._terms: Optional[Dict[str, List[str]]] = None
+        self._people: Optional[frozenset] = None
+
+    @property
+    def terms(self) -> Dict[str, List[str]]:
+        if self._terms is None:
+            self._terms = build_term_index(self.text)
+        return self._terms
+
+    @property
+    def common_words(self) -> frozenset:
+        return self.terms[_COMMON]
+
+    def is_person(self, name: str) -> bool:
+        if self._people is None:
+            self._people = frozenset(p.casefold() for p in self.terms[KIND_PERSON])
+        return name.casefold() in self._people
+
+
+def _top(counter: Counter) -> List[str]:
+    return [term for term, _ in counter.most_common(MAX_TERMS_PER_BUCKET)]
+
+
+def _strip_stopwords(name: str) -> str:
+    words = name.split()
+    while words and words[0].lower() in _STOPWORDS:
+        words = words[1:]
+    return " ".join(words)
+
+
+def _is_common(word: str, common: frozenset) -> bool:
+    """The document uses the word, or its singular/plural, in lower case."""
+    return word in common or word.rstrip("s") in common or word + "s" in common
+
+
+def _standalone_proper(text: str) -> List[str]:
+    """_PROPER matches that are not part of a longer capitalised phrase."""
+    words = []
+    for match in _PROPER.finditer(text):
+        before = text[max(0, match.start() - 40) : match.start()]
+        if _CAPS_NEIGHBOUR_BEFORE.search(before) or _CAPS_NEIGHBOUR_AFTER.match(text, match.end()):
+            continue
+        words.append(match.group(0))
+    return words
+
+
+def build_term_index(text: str) -> Dict[str, List[str]]:
+    """Candidate distractor terms of a document per kind, most frequent first."""
+    common = frozenset(_LOWER_WORD.findall(text))
+    places = Counter(
+        m.group(1) for m in _PLACE.finditer(text) if m.group(1).split()[-1].lower() not in common
+    )
+    people = Counter()
+    # Capitalised phrases that are not people: "the United States", "Great Oxidation Event"
+    named = Counter()
+    for match in _NAME.finditer(text):
+        name = _strip_stopwords(match.group(0))
+        words = name.split()
+        if len(words) < 2 or name in places:
+            continue
+        after_the = name != match.group(0) or _THE_BEFORE.search(text[max(0, match.start() - 5) : match.start()])
+        if after_the or any(w.lower() in _NOT_NAME_WORDS or _is_common(w.lower(), common) for w in words):
+            named[name] += 1
+        else:
+            people[name] += 1
+    name_words = {w for name in (*people, *named) for w in name.split()}
+    proper = Counter(
+        word
+        for word in _standalone_proper(text)
+        if word.lower() not in _STOPWORDS
+        and not _is_common(word.lower(), common)
+        and word not in places
+        and word not in name_words
+    )
+    proper.update(named)
+
+    # Lowercased names are not useful as common-noun distractors
+    skip = _STOPWORDS.union(w.lower() for name in (*people, *places, *proper) for w in name.split())
+    words = [w for w in _WORD.findall(text.lower()) if w not in skip]
+    # Verb and adverb forms make poor stand-ins for a noun answer
+    phrases = Counter(w for w in words if not w.endswith(("ed", "ing", "ly")))
+    # A bigram seen once is mostly noise
+    phrases.update(
+        {
+            f"{a} {b}": count
+            for (a, b), count in Counter(zip(words, words[1:])).items()
+            if count >= 2 and a != b
+        }
+    )
+
+    return {
+        KIND_PERSON: _top(people),
+        KIND_PLACE: _top(places),
+        KIND_YEAR: _top(Counter(_YEAR.findall(text))),
+        KIND_PROPER: _top(proper),
+        KIND_TERM: _top(phrases),
+        _COMMON: common,
+    }
+
+
+def answer_kind(question: str, answer: str, index: Optional[TermIndex] = None) -> str:
+    """
+    Kind of distractors an answer needs. With the document's index, names
+    must be known people and capitalised common nouns count as terms.
+    """
+    q = question.strip().lower()
+    a = answer.strip()
+    if a.lower() in ("true", "false"):
+        return KIND_BOOLEAN
+    if q.startswith("who"):
+        return KIND_PERSON
+    if _YEAR.search(a) and (q.startswith("when") or _YEAR.fullmatch(a)):
+        return KIND_YEAR
+    if q.startswith("where"):
+        return KIND_PLACE
+    if _NUMERIC_ANSWER.match(a) and len(a.split()) <= MAX_NUMERIC_ANSWER_WORDS:
+        return KIND_NUMBER
+    if a.isupper():
+        return KIND_PROPER
+    if a[:1].isupper() and " " in a and all(w[:1].isupper() for w in a.split()):
+        # "United States" and "Great Oxidation Event" are not people
+        return KIND_PERSON if index is not None and index.is_person(a) else KIND_PROPER
+    if a[:1].isupper() and " " not in a:
+        # "Mitochondrion" is a capitalised common noun
+        if index is not None and _is_common(a.lower(), index.common_words):
+            return KIND_TERM
+        return KIND_PROPER
+    return KIND_TERM
+
+
+def _fits(kind: str, distractor: str) -> bool:
+    """Whether an existing distractor is of the kind the answer needs."""
+    has_digit = any(ch.isdigit() for ch in distractor)
+    if kind in (KIND_PERSON, KIND_PLACE):
+        return not has_digit
+    if kind in (KIND_YEAR, KIND_NUMBER):
+        return has_digit
+    return True
+
+
+def _nearby_years(answer: str, rng: random.Random) -> List[str]:
+    """The answer with its year moved by a few to a few dozen years."""
+    match = _YEAR.search(answer)
+    year = int(match.group(1))
+    offsets = rng.sample([-30, -20, -12, -7, -4, -2, 2, 3, 5, 8, 15, 25], 6)
+    return [answer[: match.start()] + str(year + d) + answer[match.end() :] for d in offsets]
+
+
+def _nearby_numbers(answer: str, rng: random.Random) -> List[str]:
+    """
+    The answer with its first number scaled up or down, then moved by a few
+    steps, for small values that scaling leaves unchanged (0, 1, 2).
+    """
+    match = _NUMBER.search(answer)
+    value = match.group(0)
+    grouped = "," in value
+    value = value.replace(",", "")
+    decimals = len(value.split(".")[1]) if "." in value else 0
+    number = float(value)
+    step = 10.0 ** -decimals
+    factors = rng.sample([0.5, 0.75, 0.8, 1.25, 1.5, 2.0, 3.0, 10.0], 6)
+    values = [round(number * factor, decimals) for factor in factors]
+    values += [round(number + k * step, decimals) for k in (1, 2, 3, 5, 10, -1, -2, -3)]
+    out = []
+    for v in values:
+        # Counts and measures rarely go negative
+        if v == number or (v < 0 <= number):
+            continue
+        text = f"{v:{',' if grouped else ''}.{decimals}f}"
+        out.append(answer[: match.start()] + text + answer[match.end() :])
+    return out
+
+
+def _shape(text: str):
+    words = text.split()
+    return len(words), text.isupper(), text[:1].isupper()
+
+
+def _candidates(kind: str, answer: str, index: TermIndex, rng: random.Random) -> List[str]:
+    if kind == KIND_BOOLEAN:
+        return ["False" if answer.strip().lower() == "true" else "True"]
+    if kind == KIND_NUMBER:
+        return _nearby_numbers(answer, rng)
+    if kind == KIND_YEAR:
+        if _YEAR.fullmatch(answer.strip()):
+            years = list(index.terms[KIND_YEAR])
+            rng.shuffle(years)
+            return years + _nearby_years(answer, rng)
+        return _nearby_years(answer, rng)
+
+    pool = list(index.terms.get(kind, []))
+    if kind == KIND_TERM:
+        # Prefer phrases with as many words as the answer, then a shared
+        # ending ("-sis", "-ion") and a similar length
+        core = _strip_stopwords(answer.lower())
+        pool = [t for t in pool if len(t.split()) == len(core.split())] or pool
+        pool.sort(key=lambda t: (not t.endswith(core[-3:]), abs(len(t) - len(core))))
+        best = pool[:12]
+        rng.shuffle(best)
+        return best + pool[12:]
+    pool = pool[:60]
+    rng.shuffle(pool)
+    if kind in (KIND_PERSON, KIND_PLACE, KIND_PROPER):
+        shape = _shape(answer)
+        pool.sort(key=lambda t: _shape(t) != shape)
+    return pool
+
+
+def fill_distractors(item, index: TermIndex, count: int = NUM_DISTRACTORS):
+    """
+    Keep the question's distractors that match its answer kind and top them
+    up from the term index. Items that are not usable questions are returned
+    unchanged for validation to reject.
+    """
+    if not isinstance(item, dict) or not item.get("answer") or not item.get("question"):
+        return item
+    answer = str(item["answer"]).strip()
+    question = str(item["question"])
+    # Without the index so it is only built when distractors are missing
+    kind = answer_kind(question, answer)
+
+    existing = item.get("distractors")
+    existing = existing if isinstance(existing, list) else []
+    answer_words = set(answer.lower().split())
+    seen = {answer.casefold()}
+    chosen: List[str] = []
+    for d in existing:
+        d = str(d).strip()
+        if d and d.casefold() not in seen and _fits(kind, d):
+            seen.add(d.casefold())
+            chosen.append(d)
+
+    if len(chosen) < count:
+        kind = answer_kind(question, answer, index)
+        # Seeded by the question so regeneration gives the same distractors
+        rng = random.Random(zlib.crc32(question.encode("utf-8")))
+        for candidate in _candidates(kind, answer, index, rng):
+            if len(chosen) >= count:
+                break
+            key = candidate.casefold()
+            # Skip candidates that overlap the answer ("Darwin" for "Charles Darwin")
+            if key in seen or (
+                kind not in (KIND_YEAR, KIND_NUMBER) and answer_words & set(key.split())
+            ):
+                continue
+            seen.add(key)
+            chosen.append(candidate)
+            incr("distractors_filled")
+
+    filled = dict(item)
+    filled["distractors"] = chosen[:count]
+    return filled
+
+
+def fill_all(items: List, text: str) -> List:
+    """fill_distractors over raw LLM items from `text`."""
+    index = TermIndex(text)
+    return [fill_distractors(item, index) for item in items]
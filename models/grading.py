@@ -0,0 +1,219 @@
+"""
+Answer grading for quiz responses.
+
+Each question's accepted answers are normalized once into an AnswerKey
+(casefolded, accents, punctuation and leading articles removed, number
+words turned into digits, parenthesised parts offered as alternatives,
+plus any "aliases" on the question). A response then matches by exact
+form, by the same words in any order with only articles or filler words
+added, or with one typo in long words (first letters must match).
+Numbers always have to match exactly. A response is wrong if it is a
+negation, or if it is at least as close to one of the question's
+distractors as to the answer.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+FREE_TEXT_TYPES = frozenset({"short_answer", "fill_blank"})
+
+# Shortest word in which one typo is forgiven
+MIN_TYPO_WORD_LENGTH = 8
+
+_ARTICLES = frozenset({"a", "an", "the"})
+# Words a response may add around the answer ("it is the nucleus")
+_FILLER = frozenset({"it", "is", "was", "are", "were", "of", "in", "and"})
+# Normalization splits "isn't" into "isn t", so a lone "t" marks a contraction
+_NEGATIONS = frozenset({"not", "no", "never", "none", "neither", "nor", "cannot", "t"})
+_NUMBER_WORDS = {
+    word: value
+    for value, word in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve thirteen "
+        "fourteen fifteen sixteen seventeen eighteen nineteen".split()
+    )
+}
+_TENS = {
+    word: 10 * (i + 2)
+    for i, word in enumerate("twenty thirty forty fifty sixty seventy eighty ninety".split())
+}
+_THOUSANDS_SEP = re.compile(r"(?<=\d),(?=\d{3}\b)")
+_NON_WORD = re.compile(r"[^\w\s.]+")
+_LOOSE_DOT = re.compile(r"(?<!\d)\.|\.(?!\d)")
+_PARENS = re.compile(r"\(([^)]*)\)")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+class AnswerKey(NamedTuple):
+    forms: FrozenSet[str]
+    compact: FrozenSet[str]
+    token_sets: Tuple[FrozenSet[str], ...]
+    # Normalized distractors, minus any that are also accepted forms
+    distractors: FrozenSet[str] = frozenset()
+
+
+class Grade(NamedTuple):
+    correct: bool
+    # 1.0 for an exact (normalized) match, lower for fuzzy matches, 0.0 for wrong
+    score: float
+
+
+def _numbers_to_digits(tokens: List[str]) -> List[str]:
+    out: List[str] = []
+    for token in tokens:
+        if token in _TENS:
+            out.append(str(_TENS[token]))
+        elif token in _NUMBER_WORDS:
+            value = _NUMBER_WORDS[token]
+            # "twenty one" -> 21
+            if out and out[-1].isdigit() and int(out[-1]) in _TENS.values() and value < 10:
+                out[-1] = str(int(out[-1]) + value)
+            else:
+                out.append(str(value))
+        else:
+            out.append(token)
+    return out
+
+
+def normalize_answer(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = _THOUSANDS_SEP.sub("", text.replace("&", " and "))
+    text = _LOOSE_DOT.sub(" ", _NON_WORD.sub(" ", text)).replace("_", " ")
+    tokens = _numbers_to_digits(text.split())
+    while len(tokens) > 1 and tokens[0] in _ARTICLES:
+        tokens = tokens[1:]
+    return " ".join(tokens)
+
+
+def _variants(answer: str) -> List[str]:
+    """The answer with and without any parenthesised part, and that part alone."""
+    variants = [answer]
+    inner = _PARENS.findall(answer)
+    if inner:
+        variants.append(_PARENS.sub(" ", answer))
+        variants.extend(inner)
+    return variants
+
+
+def _content_words(text: str) -> FrozenSet[str]:
+    return frozenset(text.split()) - _FILLER - _ARTICLES
+
+
+@lru_cache(maxsize=4096)
+def _build_key(accepted: Tuple[str, ...], distractors: Tuple[str, ...] = ()) -> AnswerKey:
+    forms = {normalize_answer(v) for answer in accepted for v in _variants(answer)}
+    forms.discard("")
+    wrong = {normalize_answer(d) for d in distractors} - forms
+    wrong.discard("")
+    return AnswerKey(
+        forms=frozenset(forms),
+        compact=frozenset(f.replace(" ", "") for f in forms),
+        token_sets=tuple(_content_words(f) for f in forms),
+        distractors=frozenset(wrong),
+    )
+
+
+def answer_key(question: Dict) -> AnswerKey:
+    """Normalized accepted answers and distractors of a question, cached by their text."""
+    aliases = question.get("aliases") or []
+    distractors = question.get("distractors") or []
+    return _build_key(
+        (str(question.get("answer", "")), *map(str, aliases)),
+        tuple(map(str, distractors)),
+    )
+
+
+def _max_edits(word: str) -> int:
+    if len(word) < MIN_TYPO_WORD_LENGTH or _NUMBER.fullmatch(word):
+        return 0
+    return 1
+
+
+def _within_distance(a: str, b: str, limit: int) -> bool:
+    """Levenshtein distance <= limit, stopping as soon as it cannot be."""
+    if a == b:
+        return True
+    if limit == 0 or abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def _is_typo(expected: str, word: str) -> bool:
+    """`word` is `expected` with one typo; short words and numbers must be exact."""
+    limit = _max_edits(expected)
+    return limit > 0 and word[:1] == expected[:1] and _within_distance(expected, word, limit)
+
+
+def _typo_match(expected: FrozenSet[str], tokens: FrozenSet[str]) -> bool:
+    """Every response word is an expected word, or a typo of exactly one missing one."""
+    missing = expected - tokens
+    extra = tokens - expected
+    if len(missing) != len(extra):
+        return False
+    for word in extra:
+        typo_of = [e for e in missing if _is_typo(e, word)]
+        if len(typo_of) != 1:
+            return False
+        missing = missing - {typo_of[0]}
+    return not missing
+
+
+def _distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def _closer_to_distractor(given: str, key: AnswerKey) -> bool:
+    """The response is a distractor, or no farther from one than from the closest accepted form."""
+    if given in key.distractors:
+        return True
+    if not key.distractors:
+        return False
+    to_answer = min(_distance(given, form) for form in key.forms)
+    return any(_within_distance(given, d, to_answer) for d in key.distractors)
+
+
+def grade(response: str, key: AnswerKey) -> Grade:
+    given = normalize_answer(response)
+    if not given:
+        return Grade(False, 0.0)
+    if given in key.forms or given.replace(" ", "") in key.compact:
+        return Grade(True, 1.0)
+    if _closer_to_distractor(given, key):
+        return Grade(False, 0.0)
+
+    tokens = _content_words(given)
+    for expected in key.token_sets:
+        if not expected:
+            continue
+        if tokens & _NEGATIONS - expected:
+            # "not photosynthesis" is not "photosynthesis"
+            return Grade(False, 0.0)
+        if tokens == expected:
+            return Grade(True, 0.9)
+        if _typo_match(expected, tokens):
+            return Grade(True, 0.8)
+    return Grade(False, 0.0)
+
+
+def grade_answer(question: Dict, response: Optional[str]) -> Grade:
+    return grade(response or "", answer_key(question))
+
+
+def grade_many(attempts: Iterable[Tuple[Dict, str]]) -> List[Grade]:
+    """Grade (question, response) pairs in bulk, e.g. to re-grade stored attempts."""
+    return [grade(response or "", answer_key(question)) for question, response in attempts]
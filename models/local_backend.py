@@ -0,0 +1,183 @@
+import copy
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from utils.instrumentation import incr, span
+
+# transformers/torch are only needed when the local backend is selected,
+# so they are imported lazily inside LocalChatModel.
+
+# Set SMARTQUIZZER_PREFIX_CACHE=0 to encode every prompt in full
+PREFIX_CACHE_ENABLED = os.environ.get("SMARTQUIZZER_PREFIX_CACHE", "1") != "0"
+
+# Stands in for the part of a prompt after the shared prefix when rendering the chat template
+_PREFIX_END = "\x00prefix-end\x00"
+
+
+class PrefixCache(NamedTuple):
+    """KV cache of the chat-template text `text` (system message and shared prompt start)."""
+
+    text: str
+    input_ids: object
+    past_key_values: object
+
+
+class LocalChatModel:
+    """
+    Chat model running in-process through Hugging Face `transformers`.
+    Prompts are generated together as one left-padded batch. Prompts that
+    start with a shared prefix reuse its KV cache, which is computed once
+    per process, so only the rest of each prompt is encoded.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.tokenizer = None
+        self.model = None
+        self._prefix_caches: Dict[Tuple[str, str], PrefixCache] = {}
+
+    def load(self):
+        if self.model is not None:
+            return
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # Decoder-only models must be padded on the left for batched generation
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        model = AutoModelForCausalLM.from_pretrained(
+            self.model_name, torch_dtype="auto", device_map="auto"
+        )
+        model.eval()
+
+        self.tokenizer = tokenizer
+        self.model = model
+
+    def _chat_text(self, system_prompt: str, prompt: str) -> str:
+        return self.tokenizer.apply_chat_template(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+
+    def prefix_cache(self, system_prompt: str, shared_prefix: str) -> PrefixCache:
+        """The KV cache of the chat text up to the end of `shared_prefix`, built on first use."""
+        key = (system_prompt, shared_prefix)
+        cached = self._prefix_caches.get(key)
+        if cached is not None:
+            return cached
+        import torch
+        from transformers import DynamicCache
+
+        self.load()
+        text = self._chat_text(system_prompt, shared_prefix + _PREFIX_END)
+        text = text[: text.index(_PREFIX_END)]
+        input_ids = self.tokenizer(text, return_tensors="pt", add_special_tokens=False)["input_ids"]
+        input_ids = input_ids.to(self.model.device)
+        with span("local_prefix_cache.build"), torch.no_grad():
+            past_key_values = self.model(
+                input_ids=input_ids, past_key_values=DynamicCache(), use_cache=True
+            ).past_key_values
+        cached = PrefixCache(text, input_ids, past_key_values)
+        self._prefix_caches[key] = cached
+        return cached
+
+    def generate_batch(
+        self,
+        system_prompt: str,
+        prompts: List[str],
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        shared_prefix: Optional[str] = None,
+    ) -> List[Tuple[str, int, int]]:
+        """
+        Return (text, prompt_tokens, completion_tokens) for every prompt.
+        Prompts starting with `shared_prefix` are run on its cached KV state.
+        """
+        self.load()
+        texts = [self._chat_text(system_prompt, prompt) for prompt in prompts]
+        prefix = None
+        if shared_prefix and PREFIX_CACHE_ENABLED:
+            prefix = self.prefix_cache(system_prompt, shared_prefix)
+
+        cached = [i for i, text in enumerate(texts) if prefix is not None and text.startswith(prefix.text)]
+        uncached = [i for i, text in enumerate(texts) if prefix is None or not text.startswith(prefix.text)]
+        results: List[Tuple[str, int, int]] = [None] * len(texts)
+        if cached:
+            outputs = self._generate_after_prefix(
+                prefix, [texts[i][len(prefix.text) :] for i in cached], max_tokens, temperature
+            )
+            for i, output in zip(cached, outputs):
+                results[i] = output
+        if uncached:
+            encoded = self.tokenizer(
+                [texts[i] for i in uncached], return_tensors="pt", padding=True, add_special_tokens=False
+            ).to(self.model.device)
+            outputs = self._generate(encoded["input_ids"], encoded["attention_mask"], max_tokens, temperature)
+            for i, output in zip(uncached, outputs):
+                results[i] = output
+        return results
+
+    def _generate_after_prefix(
+        self, prefix: PrefixCache, suffixes: List[str], max_tokens: int, temperature: float
+    ) -> List[Tuple[str, int, int]]:
+        import torch
+
+        # The prefix ends at a line break, so encoding the rest on its own
+        # gives the same tokens as encoding the whole prompt
+        encoded = self.tokenizer(
+            suffixes, return_tensors="pt", padding=True, add_special_tokens=False
+        ).to(self.model.device)
+        rows = encoded["input_ids"].shape[0]
+        prefix_ids = prefix.input_ids.expand(rows, -1)
+        # Rows are [prefix][padding][rest]: the prefix keeps the positions it
+        # was cached at, and positions come from the attention mask, so the
+        # rest of each prompt continues right after it
+        input_ids = torch.cat([prefix_ids, encoded["input_ids"]], dim=1)
+        attention_mask = torch.cat([torch.ones_like(prefix_ids), encoded["attention_mask"]], dim=1)
+
+        # generate() appends to the cache it is given, so each batch gets a copy
+        past_key_values = copy.deepcopy(prefix.past_key_values)
+        past_key_values.batch_repeat_interleave(rows)
+        incr("local_prefix_cache.tokens_reused", prefix_ids.numel())
+        return self._generate(
+            input_ids, attention_mask, max_tokens, temperature, past_key_values=past_key_values
+        )
+
+    def _generate(
+        self, input_ids, attention_mask, max_tokens: int, temperature: float, **kwargs
+    ) -> List[Tuple[str, int, int]]:
+        import torch
+
+        with torch.no_grad():
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                max_new_tokens=max_tokens,
+                do_sample=temperature > 0,
+                temperature=temperature if temperature > 0 else None,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **kwargs,
+            )
+
+        new_tokens = output[:, input_ids.shape[1] :]
+        texts = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        prompt_counts = attention_mask.sum(dim=1).tolist()
+        completion_counts = (new_tokens != self.tokenizer.pad_token_id).sum(dim=1).tolist()
+        return list(zip(texts, prompt_counts, completion_counts))
+
+
+_local_model: Optional[LocalChatModel] = None
+
+
+def get_local_model(model_name: str) -> LocalChatModel:
+    """Return the process-wide local model, created on first use."""
+    global _local_model
+    if _local_model is None or _local_model.model_name != model_name:
+        _local_model = LocalChatModel(model_name)
+    return _local_model
@@ -1,11 +1,25 @@
 import os
 import json
-from typing import List, Dict
+import time
+from typing import Callable, List, Dict, NamedTuple, Optional
 
 from huggingface_hub import InferenceClient
 
-from utils.prompts import QUESTION_GEN_PROMPT
-from utils.text_extraction import split_into_chunks
+from models.batching import PromptBatcher, RequestScheduler
+from models.distractors import fill_all
+from models.local_backend import get_local_model
+from models.validation import ValidationReport, validate_questions
+from utils.prompts import (
+    DISTRACTORS_FROM_LLM,
+    DISTRACTORS_LOCAL,
+    FOCUS_TOPIC_RULE,
+    QUESTION_GEN_INSTRUCTIONS,
+    QUESTION_GEN_REQUEST,
+)
+from utils.text_extraction import content_hash, split_into_chunks
+from utils.instrumentation import span, timed, incr, observe
+from utils.profiling import profiled
+from services.usage import CALL_GENERATION, BudgetExceeded, check_budget, record_usage
 
 # Read token from environment: first HUGGINGFACEHUB_API_TOKEN, otherwise HF_TOKEN
 HF_TOKEN = os.environ.get("HUGGINGFACEHUB_API_TOKEN") or os.environ.get("HF_TOKEN")
@@ -13,97 +27,210 @@ HF_TOKEN = os.environ.get("HUGGINGFACEHUB_API_TOKEN") or os.environ.get("HF_TOKE
 # Conversational model (Meta-Llama 3 Instruct)
 MODEL_NAME = "meta-llama/Meta-Llama-3-8B-Instruct"
 
+# "remote" uses the Hugging Face Inference API, "local" runs the model with transformers
+LLM_BACKEND = os.environ.get("SMARTQUIZZER_LLM_BACKEND", "remote")
+
+# "llm" asks the model for distractors and tops up or replaces ones of the
+# wrong kind from the document's terms (see models.distractors); "local"
+# takes them all from the document's terms. "local" saves about a fifth of
+# the completion tokens per question, but its distractors for "what"/"which"
+# answers are often unrelated words, so it is opt-in
+DISTRACTOR_SOURCE = os.environ.get("SMARTQUIZZER_DISTRACTORS", "llm")
+
+SYSTEM_PROMPT = "You are a helpful assistant that outputs ONLY valid JSON when asked."
+
+# Start of every question generation prompt; the local backend caches its KV state
+QUESTION_GEN_PREFIX = QUESTION_GEN_INSTRUCTIONS.format(
+    distractors_field=DISTRACTORS_FROM_LLM if DISTRACTOR_SOURCE == "llm" else DISTRACTORS_LOCAL
+)
+
 client = InferenceClient(model=MODEL_NAME, token=HF_TOKEN)
 
+class ChatResult(NamedTuple):
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
 
-def call_llm_chat(prompt: str, max_tokens: int = 512, temperature: float = 0.7) -> str:
-    """
-    Get a chat-style completion from the LLM for a given prompt.
-    """
+
+def _remote_chat(prompt: str, max_tokens: int, temperature: float) -> ChatResult:
+    start = time.perf_counter()
     completion = client.chat.completions.create(
         model=MODEL_NAME,
         messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are a helpful assistant that outputs ONLY valid JSON when asked."
-                ),
-            },
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt},
         ],
         max_tokens=max_tokens,
         temperature=temperature,
     )
-    return completion.choices[0].message.content
+    observe("llm_call.seconds", time.perf_counter() - start)
+    usage = getattr(completion, "usage", None)
+    return ChatResult(
+        completion.choices[0].message.content,
+        getattr(usage, "prompt_tokens", 0) or 0,
+        getattr(usage, "completion_tokens", 0) or 0,
+    )
+
+
+def _run_local_batch(prompts: List[str], max_tokens: int, temperature: float) -> List[object]:
+    """Run one batch of prompts through the local model in a single generate() call."""
+    observe("llm_batch_size", len(prompts))
+    model = get_local_model(MODEL_NAME)
+    with span("llm_batch"):
+        outputs = model.generate_batch(
+            SYSTEM_PROMPT, prompts, max_tokens, temperature, shared_prefix=QUESTION_GEN_PREFIX
+        )
+    return [ChatResult(*output) for output in outputs]
 
 
-def clean_questions(questions: List[Dict]) -> List[Dict]:
+# The local model generates whole batches at once; remote requests are
+# independent, so each one returns as soon as it is done
+if LLM_BACKEND == "local":
+    batcher = PromptBatcher(_run_local_batch)
+else:
+    batcher = RequestScheduler(_remote_chat)
+
+
+def _record(result: ChatResult, call_type: str = CALL_GENERATION):
+    record_usage(call_type, result.prompt_tokens, result.completion_tokens, MODEL_NAME)
+    incr("llm_tokens.prompt", result.prompt_tokens)
+    incr("llm_tokens.completion", result.completion_tokens)
+
+
+def call_llm_chat(
+    prompt: str,
+    max_tokens: int = 512,
+    temperature: float = 0.7,
+    call_type: str = CALL_GENERATION,
+) -> str:
     """
-    Post-process generated questions and remove obviously mismatched or weak ones.
-    Rules:
-    - For 'who' questions, the answer should not be a number (e.g., a year).
-    - For 'when' questions, the answer should contain at least one digit (e.g., a year/date).
-    - The distractors list must be non-empty.
+    Get a chat-style completion from the LLM for a given prompt.
+    The prompt is scheduled with prompts from other sessions by `batcher`,
+    and its token usage is recorded under `call_type`.
     """
-    if not questions:
-        return []
+    check_budget()
+    result = batcher.submit(prompt, max_tokens, temperature).result()
+    _record(result, call_type)
+    return result.text
 
-    cleaned: List[Dict] = []
-    for q in questions:
-        text = str(q.get("question", "")).strip().lower()
-        ans = str(q.get("answer", "")).strip()
-        distractors = [str(d).strip() for d in q.get("distractors", [])]
 
-        if not text or not ans:
-            continue
-        if not distractors:
-            continue
+def _chunk_failed(report: ValidationReport, reason: str):
+    report.chunk_failures[reason] += 1
+    incr("chunk_failures." + reason)
 
-        # Drop who-questions whose answer looks numeric
-        if text.startswith("who") and any(ch.isdigit() for ch in ans):
-            continue
 
-        # Drop when-questions whose answer does not contain any digit
-        if text.startswith("when") and not any(ch.isdigit() for ch in ans):
-            continue
+def clean_questions(
+    questions: List[Dict],
+    report: Optional[ValidationReport] = None,
+) -> List[Dict]:
+    """
+    Post-process generated questions and remove obviously mismatched or weak ones.
+    See models.validation for the rules; rejections are counted in `report`.
+    """
+    if not questions:
+        return []
+    return validate_questions(questions, report=report)
 
-        q["distractors"] = distractors
-        cleaned.append(q)
 
-    return cleaned
+# Words per chunk sent to the LLM
+CHUNK_TOKENS = 800
 
 
+@timed("generate_questions_from_text")
 def generate_questions_from_text(
     text: str,
     num_questions: int = 10,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    report: Optional[ValidationReport] = None,
 ) -> List[Dict]:
     """
     Generate quiz questions from study material text.
     Each returned question should contain:
     question, answer, distractors, difficulty, topic, and type.
+    `on_progress(done_chunks, total_chunks)` is called after every chunk.
+    Rejected questions and failed chunks are counted in `report`.
+    Raises BudgetExceeded if the session's token budget is already used up;
+    if it runs out part-way, the remaining chunks are cancelled.
     """
     if not text.strip():
         return []
+    return generate_questions_from_chunks(
+        split_into_chunks(text, max_tokens=CHUNK_TOKENS),
+        num_questions=num_questions,
+        on_progress=on_progress,
+        report=report,
+    )
+
+
+@profiled("generation")
+@timed("generate_questions_from_chunks")
+def generate_questions_from_chunks(
+    chunks: List[str],
+    num_questions: int = 10,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    report: Optional[ValidationReport] = None,
+    focus_topic: Optional[str] = None,
+) -> List[Dict]:
+    """
+    generate_questions_from_text() for text that is already chunked, e.g.
+    chunks retrieved for one topic; `focus_topic` asks for questions on
+    that topic only. Each question records its source chunk's content hash
+    as "chunk_hash".
+    """
+    if report is None:
+        report = ValidationReport()
 
-    chunks = split_into_chunks(text, max_tokens=800)
     if not chunks:
         return []
 
-    questions: List[Dict] = []
+    check_budget()
+
+    candidates: List = []
     per_chunk = max(1, num_questions // max(1, len(chunks)))
+    focus_rule = FOCUS_TOPIC_RULE.format(topic=focus_topic) if focus_topic else ""
 
-    for chunk in chunks:
-        prompt = QUESTION_GEN_PROMPT.format(
-            context=chunk,
-            num_questions=per_chunk,
+    # Submit every chunk up front so they can share batches or run concurrently
+    futures = [
+        batcher.submit(
+            QUESTION_GEN_PREFIX
+            + QUESTION_GEN_REQUEST.format(
+                context=chunk,
+                num_questions=per_chunk,
+                focus_rule=focus_rule,
+            )
         )
+        for chunk in chunks
+    ]
+
+    budget_exhausted = False
+    for finished, future in enumerate(futures):
+        if on_progress is not None:
+            on_progress(finished, len(futures))
+
+        if future.cancelled():
+            _chunk_failed(report, "budget_exceeded")
+            continue
 
         try:
-            raw = call_llm_chat(prompt)
+            result = future.result()
         except Exception:
             # If the LLM call fails for this chunk, skip it
+            _chunk_failed(report, "llm_error")
             continue
 
+        _record(result)
+        raw = result.text
+
+        if not budget_exhausted:
+            try:
+                check_budget()
+            except BudgetExceeded:
+                # Drop every chunk that has not started yet; results already
+                # being generated are paid for, so they are still used
+                budget_exhausted = True
+                for pending in futures[finished + 1 :]:
+                    pending.cancel()
+
         # Safely extract only the JSON array/dict part
         start = raw.find("[")
         end = raw.rfind("]")
@@ -112,6 +239,7 @@ def generate_questions_from_text(
             start = raw.find("{")
             end = raw.rfind("}")
             if start == -1 or end == -1:
+                _chunk_failed(report, "no_json")
                 continue
 
         json_str = raw[start : end + 1]
@@ -120,6 +248,7 @@ def generate_questions_from_text(
             data = json.loads(json_str)
         except Exception:
             # JSON parsing failed
+            _chunk_failed(report, "invalid_json")
             continue
 
         # Normalize: dict → list
@@ -127,31 +256,21 @@ def generate_questions_from_text(
             data = [data]
 
         if not isinstance(data, list):
+            _chunk_failed(report, "not_a_list")
             continue
 
-        for q in data:
-            if not isinstance(q, dict):
-                continue
+        # Provenance: which chunk each question came from (see services.revisions)
+        source = content_hash(chunks[finished])
+        for item in data:
+            if isinstance(item, dict):
+                item["chunk_hash"] = source
+        candidates.extend(data)
 
-            # Check required keys
-            required_keys = [
-                "question",
-                "answer",
-                "distractors",
-                "difficulty",
-                "topic",
-                "type",
-            ]
-            if not all(k in q for k in required_keys):
-                continue
-
-            # Distractors must be a list
-            if not isinstance(q.get("distractors"), list):
-                continue
+    if on_progress is not None:
+        on_progress(len(futures), len(futures))
 
-            questions.append(q)
+    # Type-matched distractors from the document itself
+    candidates = fill_all(candidates, " ".join(chunks))
 
-    # Limit to the requested count and run cleaning
-    questions = questions[:num_questions]
-    questions = clean_questions(questions)
-    return questions
+    # Validate and normalize in one pass, up to the requested count
+    return validate_questions(candidates, limit=num_questions, report=report)
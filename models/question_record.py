@@ -0,0 +1,116 @@
+"""
+Compact in-memory questions for shared banks.
+
+A QuestionRecord keeps one question in __slots__ instead of a dict: the
+distractors as a tuple, the source as a tuple, and difficulty, type, topic
+and chunk hash as interned strings shared by every question in the process.
+It reads like the question dict (q["answer"], q.get("topic_id"), dict(q)),
+so the quiz, grading, assembly and analytics code takes either form, and
+to_dict() gives back the JSON form.
+"""
+import sys
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+_BASE_KEYS = ("question", "answer", "distractors", "difficulty", "topic", "type")
+# Left out of the dict form when unset
+_OPTIONAL_KEYS = ("topic_id", "chunk_hash", "source")
+_FIELDS = frozenset(_BASE_KEYS + _OPTIONAL_KEYS)
+_SOURCE_KEYS = ("doc_hash", "start", "end")
+
+
+def _intern(value) -> Optional[str]:
+    return None if value is None else sys.intern(str(value))
+
+
+def _pack_source(source) -> Optional[tuple]:
+    """(doc_hash, first page, last page, start, end) of a services.provenance source."""
+    if not isinstance(source, dict) or not all(k in source for k in _SOURCE_KEYS + ("pages",)):
+        return None
+    first, last = source["pages"]
+    return (sys.intern(source["doc_hash"]), first, last, source["start"], source["end"])
+
+
+class QuestionRecord(Mapping):
+    """One read-only question; see the module docstring."""
+
+    __slots__ = _BASE_KEYS + _OPTIONAL_KEYS + ("extra",)
+
+    def __init__(
+        self,
+        question: str,
+        answer: str,
+        distractors=(),
+        difficulty: Optional[str] = None,
+        topic: Optional[str] = None,
+        type: Optional[str] = None,
+        topic_id: Optional[int] = None,
+        chunk_hash: Optional[str] = None,
+        source: Optional[tuple] = None,
+        extra: Optional[Dict] = None,
+    ):
+        self.question = question
+        self.answer = answer
+        self.distractors = tuple(distractors)
+        self.difficulty = _intern(difficulty)
+        self.topic = _intern(topic)
+        self.type = _intern(type)
+        self.topic_id = topic_id
+        self.chunk_hash = _intern(chunk_hash)
+        self.source = source
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, q: Dict) -> "QuestionRecord":
+        extra = {k: v for k, v in q.items() if k not in _FIELDS}
+        source = _pack_source(q.get("source"))
+        if source is None and q.get("source") is not None:
+            extra["source"] = q["source"]
+        return cls(
+            q.get("question"),
+            q.get("answer"),
+            q.get("distractors") or (),
+            q.get("difficulty"),
+            q.get("topic"),
+            q.get("type"),
+            q.get("topic_id"),
+            q.get("chunk_hash"),
+            source,
+            extra,
+        )
+
+    def __getitem__(self, key):
+        if key in _FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                if key == "source":
+                    doc_hash, first, last, start, end = value
+                    return {"doc_hash": doc_hash, "pages": [first, last], "start": start, "end": end}
+                return list(value) if key == "distractors" else value
+            if key in _BASE_KEYS:
+                return value
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from _BASE_KEYS
+        for key in _OPTIONAL_KEYS:
+            if getattr(self, key) is not None:
+                yield key
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"QuestionRecord({self.question!r}, answer={self.answer!r})"
+
+    def to_dict(self) -> Dict:
+        return {key: self[key] for key in self}
+
+
+def compact_questions(questions: List[Dict]) -> tuple:
+    """A bank of question dicts as a tuple of QuestionRecords."""
+    return tuple(QuestionRecord.from_dict(q) for q in questions)
@@ -0,0 +1,221 @@
+"""
+Quiz assembly from a question bank.
+
+assemble_quiz() picks N questions whose difficulty mix follows the "Target
+difficulty" setting, spreads them over the bank's topics, optionally follows
+a question-type mix, and avoids recently served questions.
+
+The bank is indexed once into buckets of (difficulty, topic, type). Each pick
+takes a question from the bucket that most reduces the remaining shortfall
+against the targets, so assembling a quiz costs roughly N passes over the
+buckets regardless of how many questions the bank holds.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DIFFICULTY_LEVELS = ("easy", "medium", "hard")
+QUESTION_TYPES = ("mcq", "true_false", "short_answer", "fill_blank")
+
+# Target shares per "Target difficulty" option in the app
+DIFFICULTY_MODES: Dict[str, Dict[str, float]] = {
+    "Mixed": {"easy": 1 / 3, "medium": 1 / 3, "hard": 1 / 3},
+    "Mostly easy": {"easy": 0.6, "medium": 0.3, "hard": 0.1},
+    "Mostly medium": {"easy": 0.2, "medium": 0.6, "hard": 0.2},
+    "Mostly hard": {"easy": 0.1, "medium": 0.3, "hard": 0.6},
+}
+
+# Unknown difficulties/types get the code after the known ones
+_N_DIFFICULTIES = len(DIFFICULTY_LEVELS) + 1
+_N_TYPES = len(QUESTION_TYPES) + 1
+
+# Random draws tried before scanning a bucket for an unused question
+_SAMPLE_TRIES = 8
+_INDEX_CACHE_SIZE = 8
+
+
+class BankIndex:
+    """Question positions grouped into (difficulty, topic, type) buckets."""
+
+    def __init__(self, difficulty: np.ndarray, topic: np.ndarray, qtype: np.ndarray, num_topics: int):
+        self.size = len(difficulty)
+        self.num_topics = max(1, num_topics)
+        keys = (difficulty.astype(np.int64) * self.num_topics + topic) * _N_TYPES + qtype
+        order = np.argsort(keys, kind="stable")
+        bucket_keys, starts = np.unique(keys[order], return_index=True)
+        self.members: List[np.ndarray] = np.split(order, starts[1:]) if self.size else []
+        self.difficulty = bucket_keys // (self.num_topics * _N_TYPES)
+        self.topic = (bucket_keys // _N_TYPES) % self.num_topics
+        self.qtype = bucket_keys % _N_TYPES
+
+
+def _codes(values: Iterable, levels: Sequence[str]) -> np.ndarray:
+    lookup = {level: code for code, level in enumerate(levels)}
+    return np.fromiter((lookup.get(v, len(levels)) for v in values), dtype=np.int64)
+
+
+def _topic_codes(keys: Iterable) -> Tuple[np.ndarray, int]:
+    lookup: Dict = {}
+    codes = np.fromiter((lookup.setdefault(k, len(lookup)) for k in keys), dtype=np.int64)
+    return codes, len(lookup)
+
+
+def build_index(bank: Sequence[Dict]) -> BankIndex:
+    """
+    Index a bank. Columnar banks (services.bank_format.QuestionBank) are read
+    column by column; other banks are scanned once as dicts. Topics are keyed
+    by topic_id when present, otherwise by label.
+    """
+    table = getattr(bank, "table", None)
+    if table is not None:
+        return _build_columnar_index(table)
+    difficulty = _codes((q.get("difficulty") for q in bank), DIFFICULTY_LEVELS)
+    qtype = _codes((q.get("type") for q in bank), QUESTION_TYPES)
+    topic, num_topics = _topic_codes(
+        q["topic_id"] if q.get("topic_id") is not None else q.get("topic") for q in bank
+    )
+    return BankIndex(difficulty, topic, qtype, num_topics)
+
+
+def _build_columnar_index(table) -> BankIndex:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    def codes(column, levels):
+        found = pc.index_in(column.cast(pa.string()), value_set=pa.array(levels, type=pa.string()))
+        return pc.fill_null(found, len(levels)).to_numpy().astype(np.int64)
+
+    labels = table.column("topic").cast(pa.string())
+    label_codes = pc.fill_null(pc.index_in(labels, value_set=pc.unique(labels)), 0).to_numpy()
+    ids = table.column("topic_id")
+    # Topic ids where assigned, otherwise a negative code per label
+    keys = np.where(
+        pc.is_valid(ids).to_numpy(zero_copy_only=False),
+        pc.fill_null(ids, 0).to_numpy().astype(np.int64),
+        -1 - label_codes.astype(np.int64),
+    )
+    uniques, topic = np.unique(keys, return_inverse=True)
+    return BankIndex(
+        codes(table.column("difficulty"), list(DIFFICULTY_LEVELS)),
+        topic.astype(np.int64),
+        codes(table.column("type"), list(QUESTION_TYPES)),
+        len(uniques),
+    )
+
+
+_index_cache: "OrderedDict[int, Tuple[Sequence[Dict], BankIndex]]" = OrderedDict()
+
+
+def index_for(bank: Sequence[Dict]) -> BankIndex:
+    """
+    Cached build_index() for shared read-only banks (see
+    services.storage.load_shared_questions); the cache holds a reference to
+    the bank, so its id cannot be reused while cached.
+    """
+    cached = _index_cache.get(id(bank))
+    if cached is not None and cached[0] is bank:
+        _index_cache.move_to_end(id(bank))
+        return cached[1]
+    index = build_index(bank)
+    _index_cache[id(bank)] = (bank, index)
+    while len(_index_cache) > _INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    return index
+
+
+def _targets(mix: Optional[Dict[str, float]], levels: Sequence[str], n: int, size: int) -> np.ndarray:
+    """Per-level target counts for n picks; all zero (no constraint) without a mix."""
+    targets = np.zeros(size)
+    if mix:
+        total = sum(mix.values()) or 1.0
+        for code, level in enumerate(levels):
+            targets[code] = n * mix.get(level, 0.0) / total
+    return targets
+
+
+def _pick_from(members: np.ndarray, used: np.ndarray, rng: np.random.Generator) -> Optional[int]:
+    for _ in range(_SAMPLE_TRIES):
+        candidate = members[rng.integers(len(members))]
+        if not used[candidate]:
+            return int(candidate)
+    free = members[~used[members]]
+    return int(free[rng.integers(len(free))]) if len(free) else None
+
+
+def _greedy(
+    index: BankIndex,
+    n: int,
+    difficulty_mix: Optional[Dict[str, float]],
+    type_mix: Optional[Dict[str, float]],
+    used: np.ndarray,
+    rng: np.random.Generator,
+) -> List[int]:
+    want_difficulty = _targets(difficulty_mix, DIFFICULTY_LEVELS, n, _N_DIFFICULTIES)
+    want_type = _targets(type_mix, QUESTION_TYPES, n, _N_TYPES)
+    # Spread evenly over topics: fewer picks than topics means one per topic
+    want_topic = np.full(index.num_topics, n / index.num_topics)
+
+    have_difficulty = np.zeros(_N_DIFFICULTIES)
+    have_type = np.zeros(_N_TYPES)
+    have_topic = np.zeros(index.num_topics)
+    available = np.array([np.count_nonzero(~used[m]) for m in index.members])
+    # Random tie-breaking between equally good buckets
+    jitter = rng.random(len(index.members)) * 1e-3
+
+    picked: List[int] = []
+    while len(picked) < n:
+        score = (
+            (want_difficulty - have_difficulty)[index.difficulty]
+            + (want_topic - have_topic)[index.topic]
+            + (want_type - have_type)[index.qtype]
+            + jitter
+        )
+        score[available <= 0] = -np.inf
+        bucket = int(np.argmax(score))
+        if available[bucket] <= 0:
+            break
+        item = _pick_from(index.members[bucket], used, rng)
+        if item is None:
+            available[bucket] = 0
+            continue
+        used[item] = True
+        available[bucket] -= 1
+        have_difficulty[index.difficulty[bucket]] += 1
+        have_topic[index.topic[bucket]] += 1
+        have_type[index.qtype[bucket]] += 1
+        picked.append(item)
+    return picked
+
+
+def assemble_quiz(
+    bank: Sequence[Dict],
+    num_questions: int,
+    difficulty_mode: str = "Mixed",
+    type_mix: Optional[Dict[str, float]] = None,
+    recent: Iterable[int] = (),
+    seed: Optional[int] = None,
+) -> List[int]:
+    """
+    Positions in `bank` of a quiz of up to `num_questions` questions, in
+    random order. `recent` lists positions served recently; they are only
+    used when the rest of the bank cannot fill the quiz.
+    """
+    index = index_for(bank)
+    n = min(num_questions, index.size)
+    if n <= 0:
+        return []
+    rng = np.random.default_rng(seed)
+    difficulty_mix = DIFFICULTY_MODES.get(difficulty_mode, DIFFICULTY_MODES["Mixed"])
+
+    used = np.zeros(index.size, dtype=bool)
+    recent = [i for i in recent if 0 <= i < index.size]
+    used[recent] = True
+    picked = _greedy(index, n, difficulty_mix, type_mix, used, rng)
+    if len(picked) < n:
+        # Not enough unseen questions: top up from the recent ones
+        used[recent] = False
+        picked += _greedy(index, n - len(picked), difficulty_mix, type_mix, used, rng)
+
+    rng.shuffle(picked)
+    return picked
@@ -0,0 +1,152 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.instrumentation import incr
+
+REQUIRED_KEYS = ("question", "answer", "distractors", "difficulty", "topic", "type")
+DIFFICULTIES = frozenset({"easy", "medium", "hard"})
+QUESTION_TYPES = frozenset({"mcq", "true_false", "short_answer", "fill_blank"})
+
+MIN_DISTRACTORS = 1
+MAX_DISTRACTORS = 3
+
+# Rule names used as keys in ValidationReport.rejected
+RULE_NOT_A_DICT = "not_a_dict"
+RULE_MISSING_KEYS = "missing_keys"
+RULE_EMPTY_QUESTION = "empty_question"
+RULE_EMPTY_ANSWER = "empty_answer"
+RULE_DISTRACTORS_NOT_LIST = "distractors_not_list"
+RULE_TOO_FEW_DISTRACTORS = "too_few_distractors"
+RULE_BAD_DIFFICULTY = "bad_difficulty"
+RULE_BAD_TYPE = "bad_type"
+RULE_WHO_NUMERIC = "who_numeric_answer"
+RULE_WHEN_NO_DIGIT = "when_without_digit"
+RULE_WHERE_NUMERIC = "where_numeric_answer"
+
+_WHO = re.compile(r"who\b")
+_WHEN = re.compile(r"when\b")
+_WHERE = re.compile(r"where\b")
+_DIGIT = re.compile(r"\d")
+_NUMERIC = re.compile(r"[\d\s.,/-]+(?:bc|ad|bce|ce)?")
+
+
+class ValidationReport:
+    """
+    Counts of accepted questions and of rejections per rule.
+    Chunk-level failures (LLM errors, unparseable output) are counted
+    separately so wasted prompts can be traced, as is the text removed
+    before chunking and, for a revised document, what was reused from the
+    previous version.
+    """
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected: Counter = Counter()
+        self.chunk_failures: Counter = Counter()
+        self.preprocessing: Counter = Counter()
+        self.revision: Counter = Counter()
+
+    def merge(self, other: "ValidationReport"):
+        self.accepted += other.accepted
+        self.rejected.update(other.rejected)
+        self.chunk_failures.update(other.chunk_failures)
+        self.preprocessing.update(other.preprocessing)
+        self.revision.update(other.revision)
+
+    def as_dict(self) -> Dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+            "chunk_failures": dict(self.chunk_failures),
+            "preprocessing": dict(self.preprocessing),
+            "revision": dict(self.revision),
+        }
+
+
+def validate_question(item) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Validate and normalize one generated question in a single pass.
+    Returns (normalized_question, None) or (None, rejection_rule).
+    """
+    if not isinstance(item, dict):
+        return None, RULE_NOT_A_DICT
+    if not all(k in item for k in REQUIRED_KEYS):
+        return None, RULE_MISSING_KEYS
+
+    question = str(item["question"]).strip()
+    if not question:
+        return None, RULE_EMPTY_QUESTION
+    answer = str(item["answer"]).strip()
+    if not answer:
+        return None, RULE_EMPTY_ANSWER
+
+    raw_distractors = item["distractors"]
+    if not isinstance(raw_distractors, list):
+        return None, RULE_DISTRACTORS_NOT_LIST
+
+    # Drop blanks, duplicates and copies of the answer
+    seen = {answer.casefold()}
+    distractors: List[str] = []
+    for d in raw_distractors:
+        d = str(d).strip()
+        key = d.casefold()
+        if d and key not in seen:
+            seen.add(key)
+            distractors.append(d)
+    if len(distractors) < MIN_DISTRACTORS:
+        return None, RULE_TOO_FEW_DISTRACTORS
+
+    difficulty = str(item["difficulty"]).strip().lower()
+    if difficulty not in DIFFICULTIES:
+        return None, RULE_BAD_DIFFICULTY
+    qtype = str(item["type"]).strip().lower()
+    if qtype not in QUESTION_TYPES:
+        return None, RULE_BAD_TYPE
+
+    # Answer-type rules keyed on the question word
+    lowered = question.lower()
+    if _WHO.match(lowered) and _DIGIT.search(answer):
+        return None, RULE_WHO_NUMERIC
+    if _WHEN.match(lowered) and not _DIGIT.search(answer):
+        return None, RULE_WHEN_NO_DIGIT
+    if _WHERE.match(lowered) and _NUMERIC.fullmatch(answer.lower()):
+        return None, RULE_WHERE_NUMERIC
+
+    normalized = dict(item)
+    normalized.update(
+        question=question,
+        answer=answer,
+        distractors=distractors[:MAX_DISTRACTORS],
+        difficulty=difficulty,
+        topic=str(item["topic"]).strip(),
+        type=qtype,
+    )
+    return normalized, None
+
+
+def validate_questions(
+    items: Iterable,
+    limit: Optional[int] = None,
+    report: Optional[ValidationReport] = None,
+) -> List[Dict]:
+    """
+    Run validate_question over `items`, stopping once `limit` questions are
+    accepted. Rejections are counted per rule in `report`.
+    """
+    accepted: List[Dict] = []
+    for item in items:
+        if limit is not None and len(accepted) >= limit:
+            break
+        question, rule = validate_question(item)
+        if question is None:
+            if report is not None:
+                report.rejected[rule] += 1
+            incr("questions_rejected." + rule)
+            continue
+        accepted.append(question)
+
+    if report is not None:
+        report.accepted += len(accepted)
+    incr("questions_accepted", len(accepted))
+    return accepted
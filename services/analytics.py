@@ -1,7 +1,19 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple
+import numpy as np
 import pandas as pd
 
+from utils.profiling import profiled
 
+# Points drawn per time-series chart, however long the history is
+MAX_CHART_POINTS = 400
+# Attempts averaged by the rolling accuracy line
+ROLLING_WINDOW = 10
+DIFFICULTY_LEVELS = {"easy": 1, "medium": 2, "hard": 3}
+# Average bucket size above which downsample_lttb scans buckets with numpy
+_LTTB_NUMPY_BUCKET = 24
+
+
+@profiled("analytics")
 def compute_accuracy(history: List[Dict]) -> float:
     if not history:
         return 0.0
@@ -9,38 +21,117 @@ def compute_accuracy(history: List[Dict]) -> float:
     return correct / len(history)
 
 
+@profiled("analytics")
 def difficulty_progression(history: List[Dict]) -> List[str]:
     return [h["difficulty"] for h in history]
 
 
+@profiled("analytics")
+def difficulty_levels(history: List[Dict]) -> np.ndarray:
+    """Difficulty of each attempt as 1 (easy) to 3 (hard); unknown counts as medium."""
+    return np.fromiter(
+        (DIFFICULTY_LEVELS.get(h.get("difficulty"), 2) for h in history),
+        dtype=np.float64,
+        count=len(history),
+    )
+
+
+@profiled("analytics")
+def rolling_accuracy(history: List[Dict], window: int = ROLLING_WINDOW) -> np.ndarray:
+    """Accuracy over the last `window` attempts at each attempt, from a cumulative sum."""
+    correct = np.fromiter(
+        (bool(h["is_correct"]) for h in history), dtype=np.float64, count=len(history)
+    )
+    totals = np.cumsum(correct)
+    totals[window:] -= totals[:-window].copy()
+    counts = np.minimum(np.arange(1, len(correct) + 1), window)
+    return totals / counts
+
+
+@profiled("analytics")
+def downsample_lttb(
+    x: np.ndarray, y: np.ndarray, threshold: int = MAX_CHART_POINTS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets downsampling to at most `threshold` points.
+    Keeps the first and last point and, per bucket, the point that spans the
+    largest triangle with the previous pick and the next bucket's mean, so
+    peaks and dips survive.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    lengths = np.diff(np.append(edges, n))
+    # Mean of every bucket; the last "bucket" is the final point
+    mean_x = (np.add.reduceat(x, edges) / lengths).tolist()
+    mean_y = (np.add.reduceat(y, edges) / lengths).tolist()
+    starts = edges.tolist()
+    # Short buckets are cheaper to scan in Python than with numpy calls
+    vectorized = n > _LTTB_NUMPY_BUCKET * threshold
+    xs, ys = (x, y) if vectorized else (x.tolist(), y.tolist())
+
+    keep = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = starts[i], starts[i + 1]
+        xa, ya = float(xs[a]), float(ys[a])
+        dx, dy = xa - mean_x[i + 1], mean_y[i + 1] - ya
+        if vectorized:
+            area = np.abs(dx * (ys[start:end] - ya) - (xa - xs[start:end]) * dy)
+            a = start + int(area.argmax())
+        else:
+            best, a = -1.0, start
+            for j in range(start, end):
+                area = abs(dx * (ys[j] - ya) - (xa - xs[j]) * dy)
+                if area > best:
+                    best, a = area, j
+        keep.append(a)
+    keep.append(n - 1)
+    return x[keep], y[keep]
+
+
+@profiled("analytics")
 def average_response_time(history: List[Dict]) -> float:
     if not history:
         return 0.0
     return sum(h["response_time"] for h in history) / len(history)
 
 
+@profiled("analytics")
 def total_score(history: List[Dict], mark_per_question: int = 1) -> int:
     return sum(mark_per_question for h in history if h["is_correct"])
 
 
+@profiled("analytics")
 def topic_wise_performance(history: List[Dict]) -> pd.DataFrame:
     """
-    Each history entry is expected to contain a 'topic' field copied from the question at quiz time.
+    Each history entry is expected to contain a 'topic' field copied from the question at quiz time,
+    and a 'topic_id' from the topic taxonomy when the question has one.
+    Entries are grouped by topic_id; entries without one get a negative id per distinct topic.
     """
     if not history:
-        return pd.DataFrame(columns=["topic", "attempts", "correct", "accuracy"])
+        return pd.DataFrame(columns=["topic_id", "topic", "attempts", "correct", "accuracy"])
 
     rows = []
     for h in history:
         rows.append(
             {
-                "topic": h.get("topic", "Unknown"),
+                "topic_id": h.get("topic_id"),
+                "topic": h.get("topic") or "Unknown",
                 "is_correct": h["is_correct"],
             }
         )
 
     df = pd.DataFrame(rows)
-    grouped = df.groupby("topic").agg(
+    missing = df["topic_id"].isna()
+    if missing.any():
+        codes, _ = pd.factorize(df.loc[missing, "topic"])
+        df.loc[missing, "topic_id"] = -(codes + 1)
+    df["topic_id"] = df["topic_id"].astype("int64")
+
+    grouped = df.groupby("topic_id").agg(
+        topic=("topic", "first"),
         attempts=("is_correct", "count"),
         correct=("is_correct", "sum"),
     )
@@ -49,6 +140,7 @@ def topic_wise_performance(history: List[Dict]) -> pd.DataFrame:
     return grouped
 
 
+@profiled("analytics")
 def hardest_topics(df: pd.DataFrame, top_k: int = 3) -> List[str]:
     """
     Return the topics with the lowest accuracy.
@@ -59,6 +151,7 @@ def hardest_topics(df: pd.DataFrame, top_k: int = 3) -> List[str]:
     return df_sorted["topic"].tolist()
 
 
+@profiled("analytics")
 def generate_recommendation(history: List[Dict]) -> str:
     acc = compute_accuracy(history)
     if acc < 0.5:
@@ -0,0 +1,181 @@
+"""
+Columnar question-bank files in Arrow IPC format.
+
+A bank file is memory-mapped when loaded, so opening even a very large bank
+costs almost nothing, and filters by difficulty, topic or type run on the
+columns without building a dict per question. JSON stays the interchange
+format; convert between the two with
+
+    python -m services.bank_format data/questions.json data/questions.arrow
+    python -m services.bank_format data/questions.arrow data/questions.json
+"""
+import json
+import os
+import sys
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc
+
+from utils.instrumentation import timed
+
+BANK_SUFFIX = ".arrow"
+
+_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+BANK_SCHEMA = pa.schema(
+    [
+        ("question", pa.string()),
+        ("answer", pa.string()),
+        ("distractors", pa.list_(pa.string())),
+        # Few distinct values, so stored once in a dictionary per column
+        ("difficulty", _CATEGORY),
+        ("topic", _CATEGORY),
+        ("type", _CATEGORY),
+        # Canonical topic id from services.topics, null when not assigned
+        ("topic_id", pa.int32()),
+        # Any other keys of a question as a JSON object, null when none
+        ("extra", pa.string()),
+    ]
+)
+_BASE_KEYS = ("question", "answer", "distractors", "difficulty", "topic", "type")
+_OPTIONAL_KEYS = ("topic_id",)
+
+Filter = Union[None, str, Iterable[str]]
+
+
+def questions_to_table(questions: Iterable[Dict]) -> pa.Table:
+    columns: Dict[str, List] = {name: [] for name in BANK_SCHEMA.names}
+    for q in questions:
+        for key in _BASE_KEYS + _OPTIONAL_KEYS:
+            columns[key].append(q.get(key))
+        extra = {k: v for k, v in q.items() if k not in _BASE_KEYS and k not in _OPTIONAL_KEYS}
+        columns["extra"].append(json.dumps(extra, ensure_ascii=False) if extra else None)
+    arrays = [
+        pa.array(columns[field.name], type=pa.string()).dictionary_encode()
+        if field.type == _CATEGORY
+        else pa.array(columns[field.name], type=field.type)
+        for field in BANK_SCHEMA
+    ]
+    return pa.Table.from_arrays(arrays, schema=BANK_SCHEMA)
+
+
+def _row_to_question(row: Dict) -> Dict:
+    question = {key: row[key] for key in _BASE_KEYS}
+    for key in _OPTIONAL_KEYS:
+        if row.get(key) is not None:
+            question[key] = row[key]
+    if row["extra"]:
+        question.update(json.loads(row["extra"]))
+    return question
+
+
+class QuestionBank(Sequence):
+    """
+    Read-only sequence of questions backed by an Arrow table. A question is
+    only turned into a dict when it is accessed, so it can stand in for the
+    tuple of dicts returned by the JSON loader.
+    """
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("question index out of range")
+        return _row_to_question(self.table.slice(index, 1).to_pylist()[0])
+
+    def to_list(self) -> List[Dict]:
+        return [_row_to_question(row) for row in self.table.to_pylist()]
+
+    def mask(
+        self,
+        difficulty: Filter = None,
+        topic: Filter = None,
+        question_type: Filter = None,
+        topic_id: Union[None, int, Iterable[int]] = None,
+    ) -> np.ndarray:
+        """Boolean array of the questions matching every given filter."""
+        selected = np.ones(len(self), dtype=bool)
+        if topic_id is not None:
+            ids = [topic_id] if isinstance(topic_id, int) else list(topic_id)
+            matches = pc.is_in(self.table.column("topic_id"), value_set=pa.array(ids, type=pa.int32()))
+            selected &= matches.to_numpy(zero_copy_only=False)
+        for column, wanted in (("difficulty", difficulty), ("topic", topic), ("type", question_type)):
+            if wanted is None:
+                continue
+            values = [wanted] if isinstance(wanted, str) else list(wanted)
+            matches = pc.is_in(self.table.column(column), value_set=pa.array(values, type=pa.string()))
+            selected &= matches.to_numpy(zero_copy_only=False)
+        return selected
+
+    def indices(self, **filters) -> np.ndarray:
+        """Positions of the questions matching the filters (see mask())."""
+        return np.flatnonzero(self.mask(**filters))
+
+    def select(self, **filters) -> "QuestionBank":
+        """New bank holding only the questions matching the filters."""
+        return QuestionBank(self.table.filter(pa.array(self.mask(**filters))))
+
+    def value_counts(self, column: str) -> Dict[str, int]:
+        """Number of questions per value of a category column, e.g. "topic"."""
+        counts = pc.value_counts(self.table.column(column))
+        return {
+            item["values"]: item["counts"]
+            for item in counts.to_pylist()
+            if item["values"] is not None
+        }
+
+
+@timed("save_bank")
+def save_bank(questions: Iterable[Dict], path: Path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = questions_to_table(questions)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, BANK_SCHEMA) as writer:
+            writer.write_table(table)
+    # Replace atomically: readers may still have the old file mapped
+    os.replace(tmp, path)
+
+
+@timed("load_bank")
+def load_bank(path: Path) -> QuestionBank:
+    """Memory-map a bank file; column data is read lazily from the page cache."""
+    source = pa.memory_map(str(path), "r")
+    table = pa.ipc.open_file(source).read_all()
+    # Files written before a column was added get it as all nulls
+    for field in BANK_SCHEMA:
+        if field.name not in table.schema.names:
+            table = table.append_column(field, pa.nulls(table.num_rows, field.type))
+    return QuestionBank(table.select(BANK_SCHEMA.names))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from services.storage import load_questions_json, save_questions_json
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__, file=sys.stderr)
+        return 2
+    src, dst = Path(argv[0]), Path(argv[1])
+    if src.suffix == BANK_SUFFIX:
+        save_questions_json(load_bank(src).to_list(), dst)
+    else:
+        save_bank(load_questions_json(src), dst)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
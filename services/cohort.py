@@ -0,0 +1,270 @@
+"""
+Class-wide quiz analytics.
+
+Every answered question is appended to an attempt log in SQLite and, in the
+same transaction, added to rollup tables: per day x topic x difficulty
+(attempts, correct answers, response-time histogram) and per question.
+The query functions read only the rollups, so cohort dashboards cost the
+same whether the log holds a thousand attempts or millions.
+"""
+import bisect
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services.storage import BASE_DIR
+from services.topics import topic_id, topic_labels
+
+ATTEMPTS_DB_PATH = BASE_DIR / "attempts.db"
+
+# Upper edges (seconds) of the response-time histogram buckets; the last bucket is open
+RESPONSE_TIME_EDGES = (5, 10, 20, 30, 60, 120)
+RESPONSE_TIME_BUCKETS = tuple(
+    [f"<{RESPONSE_TIME_EDGES[0]}s"]
+    + [f"{lo}–{hi}s" for lo, hi in zip(RESPONSE_TIME_EDGES, RESPONSE_TIME_EDGES[1:])]
+    + [f"≥{RESPONSE_TIME_EDGES[-1]}s"]
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    ts REAL NOT NULL,
+    session_id TEXT,
+    question_key TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    is_correct INTEGER NOT NULL,
+    response_time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    day TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    time_sum REAL NOT NULL,
+    PRIMARY KEY (day, topic_id, difficulty)
+);
+CREATE TABLE IF NOT EXISTS time_histogram (
+    day TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    PRIMARY KEY (day, topic_id, difficulty, bucket)
+);
+CREATE TABLE IF NOT EXISTS questions (
+    question_key TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    difficulty TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS question_rollup (
+    question_key TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    time_sum REAL NOT NULL,
+    last_ts REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread, kept open, as in services.usage."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        ATTEMPTS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(ATTEMPTS_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def question_key(question: Dict) -> str:
+    """Stable id of a question across banks: a hash of its text and answer."""
+    text = f"{question.get('question', '')}\x1f{question.get('answer', '')}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _day(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+def _add_to_rollups(conn: sqlite3.Connection, row: Dict):
+    day = _day(row["ts"])
+    bucket = bisect.bisect_right(RESPONSE_TIME_EDGES, row["response_time"])
+    conn.execute(
+        """
+        INSERT INTO daily_rollup VALUES (?, ?, ?, 1, ?, ?)
+        ON CONFLICT (day, topic_id, difficulty) DO UPDATE SET
+            attempts = attempts + 1,
+            correct = correct + excluded.correct,
+            time_sum = time_sum + excluded.time_sum
+        """,
+        (day, row["topic_id"], row["difficulty"], row["is_correct"], row["response_time"]),
+    )
+    conn.execute(
+        """
+        INSERT INTO time_histogram VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (day, topic_id, difficulty, bucket) DO UPDATE SET attempts = attempts + 1
+        """,
+        (day, row["topic_id"], row["difficulty"], bucket),
+    )
+    conn.execute(
+        """
+        INSERT INTO question_rollup VALUES (?, 1, ?, ?, ?)
+        ON CONFLICT (question_key) DO UPDATE SET
+            attempts = attempts + 1,
+            correct = correct + excluded.correct,
+            time_sum = time_sum + excluded.time_sum,
+            last_ts = MAX(last_ts, excluded.last_ts)
+        """,
+        (row["question_key"], row["is_correct"], row["response_time"], row["ts"]),
+    )
+
+
+def record_attempt(
+    question: Dict,
+    is_correct: bool,
+    response_time: float,
+    session_id: Optional[str] = None,
+    ts: Optional[float] = None,
+):
+    """Append one answered question to the log and update the rollups with it."""
+    tid = question.get("topic_id")
+    row = {
+        "ts": ts if ts is not None else time.time(),
+        "session_id": session_id,
+        "question_key": question_key(question),
+        "topic_id": tid if tid is not None else topic_id(question.get("topic")),
+        "difficulty": str(question.get("difficulty") or "unknown"),
+        "is_correct": int(bool(is_correct)),
+        "response_time": max(0.0, float(response_time or 0.0)),
+    }
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO attempts VALUES (:ts, :session_id, :question_key, :topic_id, "
+            ":difficulty, :is_correct, :response_time)",
+            row,
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO questions VALUES (?, ?, ?, ?)",
+            (row["question_key"], str(question.get("question", "")), row["topic_id"], row["difficulty"]),
+        )
+        _add_to_rollups(conn, row)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def rebuild_rollups():
+    """Recompute every rollup from the attempt log, e.g. after a rollup table was lost."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table in ("daily_rollup", "time_histogram", "question_rollup"):
+            conn.execute(f"DELETE FROM {table}")
+        for row in conn.execute("SELECT * FROM attempts ORDER BY ts").fetchall():
+            _add_to_rollups(conn, dict(row))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _with_labels(rows: List[sqlite3.Row]) -> List[Dict]:
+    labels = topic_labels()
+    out = []
+    for row in rows:
+        item = dict(row)
+        item["topic"] = labels.get(item["topic_id"], "Unknown")
+        out.append(item)
+    return out
+
+
+def cohort_summary(since_day: Optional[str] = None) -> Dict:
+    """Total attempts, accuracy and mean response time over all users."""
+    row = _connect().execute(
+        """
+        SELECT COALESCE(SUM(attempts), 0) AS attempts,
+               COALESCE(SUM(correct), 0) AS correct,
+               COALESCE(SUM(time_sum), 0) AS time_sum
+        FROM daily_rollup WHERE day >= ?
+        """,
+        (since_day or "",),
+    ).fetchone()
+    attempts = row["attempts"]
+    return {
+        "attempts": attempts,
+        "accuracy": row["correct"] / attempts if attempts else 0.0,
+        "avg_response_time": row["time_sum"] / attempts if attempts else 0.0,
+    }
+
+
+def topic_accuracy_over_time(since_day: Optional[str] = None) -> List[Dict]:
+    """Attempts and accuracy per day and topic, oldest day first."""
+    rows = _connect().execute(
+        """
+        SELECT day, topic_id, SUM(attempts) AS attempts, SUM(correct) AS correct,
+               CAST(SUM(correct) AS REAL) / SUM(attempts) AS accuracy
+        FROM daily_rollup WHERE day >= ?
+        GROUP BY day, topic_id
+        ORDER BY day, topic_id
+        """,
+        (since_day or "",),
+    ).fetchall()
+    return _with_labels(rows)
+
+
+def response_time_distribution(
+    topic_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    since_day: Optional[str] = None,
+) -> List[Dict]:
+    """Attempts per response-time bucket (see RESPONSE_TIME_BUCKETS), optionally for one topic/difficulty."""
+    clauses, params = ["day >= ?"], [since_day or ""]
+    if topic_id is not None:
+        clauses.append("topic_id = ?")
+        params.append(topic_id)
+    if difficulty is not None:
+        clauses.append("difficulty = ?")
+        params.append(difficulty)
+    counts = dict(
+        _connect().execute(
+            f"SELECT bucket, SUM(attempts) FROM time_histogram WHERE {' AND '.join(clauses)} GROUP BY bucket",
+            params,
+        ).fetchall()
+    )
+    return [
+        {"bucket": label, "attempts": counts.get(i, 0)}
+        for i, label in enumerate(RESPONSE_TIME_BUCKETS)
+    ]
+
+
+def question_stats(min_attempts: int = 1, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Per-question attempts, p-value (share answered correctly) and mean
+    response time, hardest questions first.
+    """
+    rows = _connect().execute(
+        """
+        SELECT r.question_key, q.question, q.topic_id, q.difficulty, r.attempts, r.correct,
+               CAST(r.correct AS REAL) / r.attempts AS p_value,
+               r.time_sum / r.attempts AS avg_response_time
+        FROM question_rollup r JOIN questions q USING (question_key)
+        WHERE r.attempts >= ?
+        ORDER BY p_value, attempts DESC
+        LIMIT ?
+        """,
+        (min_attempts, limit if limit is not None else -1),
+    ).fetchall()
+    return _with_labels(rows)
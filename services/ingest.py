@@ -0,0 +1,192 @@
+"""
+Headless batch ingestion: build question banks for every PDF in a directory.
+
+    python -m services.ingest course_pdfs/ --out data/banks --workers 4
+
+Documents are processed in parallel worker processes through the same
+pipeline as the app. Finished documents are recorded in a checkpoint file
+in the output directory, keyed by content hash and settings, so an
+interrupted run can simply be started again: documents already processed
+are skipped and failed ones are retried. A changed file is regenerated
+against the previous version with the same path, so only its edited
+chunks go to the LLM (see services.revisions).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List
+
+from services.jobs import document_hash, job_id_for
+from services.storage import BASE_DIR, save_questions_json
+
+BANK_FORMATS = {"json": ".json", "arrow": ".arrow"}
+
+DEFAULT_OUT_DIR = BASE_DIR / "banks"
+CHECKPOINT_NAME = "checkpoint.json"
+
+
+def load_checkpoint(path: Path) -> Dict[str, Dict]:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, dict) else {}
+
+
+def save_checkpoint(path: Path, checkpoint: Dict[str, Dict]):
+    """Write the checkpoint atomically so an interrupted run never corrupts it."""
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def find_pdfs(source: Path, recursive: bool = False) -> List[Path]:
+    pattern = "**/*.pdf" if recursive else "*.pdf"
+    return sorted(p for p in source.glob(pattern) if p.is_file())
+
+
+def _ingest_document(pdf_path: str, bank_path: str, doc_hash: str, settings: Dict) -> Dict:
+    """Runs in a worker process: generate one bank and write it to disk."""
+    # Imported here so only worker processes load the model client
+    from models.validation import ValidationReport
+    from services.pipeline import generate_bank_from_pdf
+    from services.revisions import document_key, previous_version, record_version
+    from services.usage import usage_context
+
+    start = time.perf_counter()
+    path = Path(pdf_path).resolve()
+    name = document_key(str(path.parent), path.name)
+    report = ValidationReport()
+    with usage_context(doc_hash=doc_hash):
+        questions = generate_bank_from_pdf(
+            pdf_path,
+            num_questions=settings["num_questions"],
+            report=report,
+            skip_toc_and_index=settings["skip_toc_and_index"],
+            doc_hash=doc_hash,
+            previous=previous_version(name, doc_hash, settings),
+        )
+    if bank_path.endswith(BANK_FORMATS["arrow"]):
+        from services.bank_format import save_bank
+
+        save_bank(questions, Path(bank_path))
+    else:
+        save_questions_json(questions, Path(bank_path))
+    record_version(name, doc_hash, bank_path, settings)
+    return {
+        "questions": len(questions),
+        "report": report.as_dict(),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def ingest_directory(
+    source: Path,
+    out_dir: Path = DEFAULT_OUT_DIR,
+    settings: Dict = None,
+    workers: int = 1,
+    recursive: bool = False,
+    bank_format: str = "json",
+) -> Dict[str, Dict]:
+    """
+    Generate a bank for every PDF under `source` that the checkpoint does not
+    already list as done. Returns the updated checkpoint.
+    """
+    settings = settings or {"num_questions": 10, "skip_toc_and_index": True}
+    out_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint_path = out_dir / CHECKPOINT_NAME
+    checkpoint = load_checkpoint(checkpoint_path)
+
+    # Group files by content so duplicates are generated once
+    pending: Dict[str, Dict] = {}
+    skipped = 0
+    for pdf in find_pdfs(source, recursive):
+        doc_hash = document_hash(pdf.read_bytes())
+        key = job_id_for(doc_hash, settings)
+        entry = checkpoint.get(key)
+        if entry and entry["status"] == "done" and Path(entry["bank"]).exists():
+            skipped += 1
+            continue
+        if key in pending:
+            pending[key]["sources"].append(str(pdf))
+            continue
+        pending[key] = {
+            "doc_hash": doc_hash,
+            "sources": [str(pdf)],
+            "bank": str(out_dir / f"{pdf.stem}-{key[:12]}{BANK_FORMATS[bank_format]}"),
+        }
+
+    total = len(pending)
+    print(f"[ingest] {total} to process, {skipped} already done", file=sys.stderr, flush=True)
+    if not total:
+        return checkpoint
+
+    finished = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                _ingest_document, item["sources"][0], item["bank"], item["doc_hash"], settings
+            ): key
+            for key, item in pending.items()
+        }
+        try:
+            for future in as_completed(futures):
+                key = futures[future]
+                item = pending[key]
+                entry = {**item, "settings": settings, "finished_at": time.time()}
+                name = Path(item["sources"][0]).name
+                finished += 1
+                try:
+                    entry.update(future.result(), status="done")
+                    line = f"{entry['questions']} questions in {entry['seconds']}s"
+                except Exception as exc:
+                    entry.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+                    line = f"FAILED ({entry['error']})"
+                print(f"[ingest] {finished}/{total} {name}: {line}", file=sys.stderr, flush=True)
+                checkpoint[key] = entry
+                save_checkpoint(checkpoint_path, checkpoint)
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("[ingest] interrupted; rerun to resume", file=sys.stderr, flush=True)
+            raise
+    return checkpoint
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", type=Path, help="directory containing PDFs")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT_DIR, help="where banks and the checkpoint go")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="documents processed in parallel")
+    parser.add_argument("--num-questions", type=int, default=10, help="questions per document")
+    parser.add_argument("--keep-toc", action="store_true", help="keep table of contents and index pages")
+    parser.add_argument("--recursive", action="store_true", help="also search subdirectories")
+    parser.add_argument("--format", choices=sorted(BANK_FORMATS), default="json", help="bank file format")
+    args = parser.parse_args(argv)
+
+    if not args.source.is_dir():
+        parser.error(f"{args.source} is not a directory")
+
+    settings = {"num_questions": args.num_questions, "skip_toc_and_index": not args.keep_toc}
+    try:
+        checkpoint = ingest_directory(
+            args.source,
+            args.out,
+            settings,
+            workers=max(1, args.workers),
+            recursive=args.recursive,
+            bank_format=args.format,
+        )
+    except KeyboardInterrupt:
+        return 130
+    failed = [entry for entry in checkpoint.values() if entry["status"] == "failed"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,414 @@
+"""
+Background generation jobs backed by a local SQLite queue.
+
+The Streamlit app submits a (document hash, settings) job and polls its
+status; a separate worker process (`python -m services.jobs`) runs the
+generation pipeline and persists the result, running up to
+WORKER_CONCURRENCY jobs at once so prompts from different sessions share
+LLM batches. Submitting the same job twice
+returns the existing one instead of generating again. Follow-up jobs for
+one topic of a document (submit_topic_job) reuse its chunk index instead
+of the PDF.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from services.storage import (
+    BASE_DIR,
+    save_questions_json,
+    load_shared_questions,
+    save_session_upload,
+    discard_upload,
+    cleanup_stale_sessions,
+)
+from utils import instrumentation
+
+JOBS_DB_PATH = BASE_DIR / "jobs.db"
+JOB_RESULTS_DIR = BASE_DIR / "jobs"
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# A worker that has not refreshed its heartbeat for this long is considered dead
+WORKER_HEARTBEAT_TIMEOUT = 15.0
+WORKER_HEARTBEAT_INTERVAL = 3.0
+WORKER_POLL_INTERVAL = 0.5
+WORKER_CLEANUP_INTERVAL = 600.0
+# Jobs the worker runs at the same time, each on its own thread
+WORKER_CONCURRENCY = max(1, int(os.environ.get("SMARTQUIZZER_WORKER_JOBS", "4")))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    doc_hash TEXT NOT NULL,
+    pdf_path TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done_chunks INTEGER NOT NULL DEFAULT 0,
+    total_chunks INTEGER NOT NULL DEFAULT 0,
+    num_results INTEGER NOT NULL DEFAULT 0,
+    report TEXT,
+    session_id TEXT,
+    document_key TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+# Columns added to the jobs table after it was first created
+_ADDED_COLUMNS = {"report": "TEXT", "session_id": "TEXT", "document_key": "TEXT"}
+
+
+def _connect() -> sqlite3.Connection:
+    JOBS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for name, decl in _ADDED_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+    return conn
+
+
+def document_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def job_id_for(doc_hash: str, settings: Dict) -> str:
+    key = doc_hash + json.dumps(settings, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:24]
+
+
+def job_result_path(job_id: str) -> Path:
+    return JOB_RESULTS_DIR / f"{job_id}.json"
+
+
+def save_upload(data: bytes, session_id: str) -> Dict:
+    """
+    Store uploaded PDF bytes in the session's namespace so the worker process
+    can read them. The worker deletes the file once the job has run.
+    """
+    path = save_session_upload(data, session_id)
+    return {"doc_hash": document_hash(data), "pdf_path": str(path)}
+
+
+def submit_job(
+    doc_hash: str,
+    pdf_path: str,
+    settings: Dict,
+    session_id: Optional[str] = None,
+    document_key: Optional[str] = None,
+) -> str:
+    """
+    Queue a generation job and return its id. Duplicate submissions of a
+    queued, running or finished job are coalesced; failed jobs are retried.
+    The upload at `pdf_path` is discarded if the job was coalesced.
+    Token usage of the job is charged to `session_id`. The bank is recorded
+    as the latest version of `document_key` (see services.revisions), which
+    is not part of the job id, so identical uploads under other names still
+    coalesce.
+    """
+    job_id = job_id_for(doc_hash, settings)
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            """
+            INSERT INTO jobs (id, doc_hash, pdf_path, settings, status, session_id, document_key, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                status = excluded.status,
+                pdf_path = excluded.pdf_path,
+                session_id = excluded.session_id,
+                document_key = excluded.document_key,
+                done_chunks = 0,
+                total_chunks = 0,
+                error = NULL,
+                updated_at = excluded.updated_at
+            WHERE jobs.status = 'failed'
+            """,
+            (job_id, doc_hash, pdf_path, json.dumps(settings, sort_keys=True),
+             STATUS_QUEUED, session_id, document_key, now, now),
+        )
+        row = conn.execute("SELECT pdf_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    if row["pdf_path"] != pdf_path:
+        discard_upload(pdf_path)
+    return job_id
+
+
+def submit_topic_job(
+    doc_hash: str,
+    topic: str,
+    num_questions: int = 10,
+    repeat: int = 0,
+    session_id: Optional[str] = None,
+) -> str:
+    """
+    Queue a follow-up job for more questions on one topic of an already
+    generated document; it reads the document's chunk index, not the PDF.
+    `repeat` tells repeated requests for the same topic apart.
+    """
+    settings = {"topic": topic, "num_questions": num_questions, "repeat": repeat}
+    return submit_job(doc_hash, "", settings, session_id=session_id)
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    job = dict(row)
+    job["settings"] = json.loads(job["settings"])
+    job["report"] = json.loads(job["report"]) if job["report"] else None
+    return job
+
+
+def load_job_result(job_id: str) -> Tuple[Dict, ...]:
+    """Finished results are read-only banks shared by every session."""
+    return load_shared_questions(job_result_path(job_id))
+
+
+def recent_result_paths(limit: int = 5) -> List[Path]:
+    """Result banks of the most recently finished jobs, newest first."""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT id FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+            (STATUS_DONE, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [job_result_path(row["id"]) for row in rows]
+
+
+def _claim_next_job(conn: sqlite3.Connection) -> Optional[Dict]:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+            (STATUS_QUEUED,),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, time.time(), row["id"]),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if row is None:
+        return None
+    job = dict(row)
+    job["settings"] = json.loads(job["settings"])
+    return job
+
+
+def _update_job(conn: sqlite3.Connection, job_id: str, **fields):
+    fields["updated_at"] = time.time()
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    conn.execute(
+        f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id)
+    )
+
+
+def run_job(conn: sqlite3.Connection, job: Dict):
+    # Imported here so the app can use the queue without loading the pipeline
+    from models.validation import ValidationReport
+    from services.pipeline import generate_bank_from_pdf, generate_topic_questions
+    from services.revisions import previous_version, record_version
+    from services.usage import BudgetExceeded, usage_context
+
+    def on_progress(done: int, total: int):
+        _update_job(conn, job["id"], done_chunks=done, total_chunks=total)
+
+    # Banks of the same document key are versions of one document
+    name = job["document_key"]
+    report = ValidationReport()
+    try:
+        with usage_context(session_id=job["session_id"], doc_hash=job["doc_hash"]):
+            if job["settings"].get("topic"):
+                questions = generate_topic_questions(
+                    job["doc_hash"],
+                    job["settings"]["topic"],
+                    num_questions=job["settings"].get("num_questions", 10),
+                    on_progress=on_progress,
+                    report=report,
+                )
+            else:
+                questions = generate_bank_from_pdf(
+                    job["pdf_path"],
+                    num_questions=job["settings"].get("num_questions", 10),
+                    on_progress=on_progress,
+                    report=report,
+                    skip_toc_and_index=job["settings"].get("skip_toc_and_index", False),
+                    doc_hash=job["doc_hash"],
+                    previous=previous_version(name, job["doc_hash"], job["settings"]) if name else None,
+                )
+        save_questions_json(questions, job_result_path(job["id"]))
+        if name:
+            record_version(name, job["doc_hash"], str(job_result_path(job["id"])), job["settings"])
+        _update_job(
+            conn,
+            job["id"],
+            status=STATUS_DONE,
+            num_results=len(questions),
+            report=json.dumps(report.as_dict()),
+        )
+    except BudgetExceeded as exc:
+        _update_job(conn, job["id"], status=STATUS_FAILED, error=f"BudgetExceeded: {exc}")
+    except Exception:
+        _update_job(conn, job["id"], status=STATUS_FAILED, error=traceback.format_exc())
+    finally:
+        if job["pdf_path"]:
+            discard_upload(job["pdf_path"])
+        instrumentation.flush("worker")
+
+
+def _run_claimed_job(job: Dict):
+    # sqlite3 connections stay on the thread that opened them
+    conn = _connect()
+    try:
+        run_job(conn, job)
+    finally:
+        conn.close()
+
+
+def _acquire_worker_slot(conn: sqlite3.Connection) -> bool:
+    """Register this process as the worker unless a live one already exists."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT heartbeat FROM workers WHERE name = 'main'").fetchone()
+        if row is not None and now - row["heartbeat"] < WORKER_HEARTBEAT_TIMEOUT:
+            conn.execute("ROLLBACK")
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO workers (name, pid, heartbeat) VALUES ('main', ?, ?)",
+            (os.getpid(), now),
+        )
+        # Jobs left running by a dead worker are picked up again
+        conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+            (STATUS_QUEUED, now, STATUS_RUNNING),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+
+def _heartbeat_loop(stop: threading.Event):
+    conn = _connect()
+    try:
+        while not stop.wait(WORKER_HEARTBEAT_INTERVAL):
+            conn.execute(
+                "UPDATE workers SET heartbeat = ? WHERE name = 'main' AND pid = ?",
+                (time.time(), os.getpid()),
+            )
+    finally:
+        conn.close()
+
+
+def run_worker(poll_interval: float = WORKER_POLL_INTERVAL, idle_exit: Optional[float] = None):
+    """
+    Process queued jobs until stopped, up to WORKER_CONCURRENCY at a time.
+    With `idle_exit`, the worker exits after that many seconds without work.
+    """
+    conn = _connect()
+    if not _acquire_worker_slot(conn):
+        conn.close()
+        return
+
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat_loop, args=(stop,), daemon=True).start()
+    pool = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="job")
+    running = set()
+    try:
+        # Imported here so the app can use the queue without loading the pipeline
+        from services.warmup import warm_worker
+
+        # After the heartbeat starts, as loading a local model can take a while
+        warm_worker()
+
+        idle_since = time.time()
+        last_cleanup = 0.0
+        while True:
+            if time.time() - last_cleanup > WORKER_CLEANUP_INTERVAL:
+                cleanup_stale_sessions()
+                last_cleanup = time.time()
+
+            job = _claim_next_job(conn) if len(running) < WORKER_CONCURRENCY else None
+            if job is not None:
+                running.add(pool.submit(_run_claimed_job, job))
+                continue
+            if running:
+                finished, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                if finished:
+                    idle_since = time.time()
+                continue
+            if idle_exit is not None and time.time() - idle_since > idle_exit:
+                break
+            time.sleep(poll_interval)
+    finally:
+        pool.shutdown(wait=True)
+        stop.set()
+        conn.execute("DELETE FROM workers WHERE name = 'main' AND pid = ?", (os.getpid(),))
+        conn.close()
+
+
+def worker_alive() -> bool:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT heartbeat FROM workers WHERE name = 'main'").fetchone()
+    finally:
+        conn.close()
+    return row is not None and time.time() - row["heartbeat"] < WORKER_HEARTBEAT_TIMEOUT
+
+
+def ensure_worker_running():
+    """Start a local worker process if none is alive."""
+    if worker_alive():
+        return
+    JOB_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    log = open(JOB_RESULTS_DIR / "worker.log", "ab")
+    subprocess.Popen(
+        [sys.executable, "-m", "services.jobs"],
+        cwd=os.getcwd(),
+        stdout=log,
+        stderr=subprocess.STDOUT,
+        stdin=subprocess.DEVNULL,
+    )
+    log.close()
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,106 @@
+from typing import Callable, Dict, List, Optional
+
+from models.question_generator import (
+    CHUNK_TOKENS,
+    generate_questions_from_chunks,
+)
+from models.validation import ValidationReport
+from services.provenance import attach_sources, save_text_cache
+from services.retrieval import load_chunk_index, save_chunk_index
+from services.revisions import PreviousVersion, plan_revision
+from services.topics import normalize_topics
+from utils.boilerplate import strip_boilerplate
+from utils.instrumentation import timed
+from utils.text_extraction import chunk_pages, content_hash, extract_pages_from_pdf
+
+# Chunks retrieved for a follow-up request on one topic
+TOPIC_CHUNKS = 3
+
+
+def generate_bank_from_pdf(
+    pdf_path: str,
+    num_questions: int = 10,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    report: Optional[ValidationReport] = None,
+    skip_toc_and_index: bool = False,
+    doc_hash: Optional[str] = None,
+    previous: Optional[PreviousVersion] = None,
+) -> List[Dict]:
+    """
+    Full generation pipeline for one document: extract, strip repeated
+    headers/footers, chunk (keeping each chunk's pages), generate, map topics to the
+    taxonomy. With `doc_hash`, the document's chunks are also indexed for
+    generate_topic_questions() and later revisions, and every question gets
+    a "source" passage (see services.provenance). With the `previous`
+    version of the document, only its new or edited chunks are generated
+    for and the questions of unchanged chunks are kept (see services.revisions).
+    Shared by the background job worker and any other headless caller.
+    """
+    pages = extract_pages_from_pdf(pdf_path)
+    pages, stripped = strip_boilerplate(
+        pages, drop_toc=skip_toc_and_index, drop_index=skip_toc_and_index
+    )
+    if report is not None:
+        report.preprocessing.update(stripped)
+    page_chunks = chunk_pages(pages, max_tokens=CHUNK_TOKENS)
+    chunks = [chunk.text for chunk in page_chunks]
+    page_hashes = [content_hash(page) for page in pages if page.strip()]
+    index = None
+    if doc_hash:
+        offsets = save_text_cache(doc_hash, chunks)
+        spans = [
+            (chunk.first_page, chunk.last_page, start, end)
+            for chunk, (start, end) in zip(page_chunks, offsets)
+        ]
+        index = save_chunk_index(doc_hash, chunks, page_hashes, spans)
+
+    if previous is None:
+        kept = []
+        questions = generate_questions_from_chunks(
+            chunks, num_questions=num_questions, on_progress=on_progress, report=report
+        ) or []
+    else:
+        kept, todo, stats = plan_revision(previous, [content_hash(c) for c in chunks], page_hashes)
+        if report is not None:
+            report.revision.update(stats)
+        # As many questions per changed chunk as a full run would ask for
+        per_chunk = max(1, num_questions // max(1, len(chunks)))
+        questions = generate_questions_from_chunks(
+            [chunks[i] for i in todo],
+            num_questions=per_chunk * len(todo),
+            on_progress=on_progress,
+            report=report,
+        ) or []
+
+    questions = kept + normalize_topics(questions)
+    if index is not None:
+        # Kept questions now point at this version's pages and text
+        attach_sources(questions, doc_hash, index)
+    return questions
+
+
+@timed("generate_topic_questions")
+def generate_topic_questions(
+    doc_hash: str,
+    topic: str,
+    num_questions: int = 10,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    report: Optional[ValidationReport] = None,
+) -> List[Dict]:
+    """
+    More questions on one topic of an already generated document, from only
+    the chunks that best match the topic. Raises FileNotFoundError if the
+    document was generated before chunks were indexed.
+    """
+    index = load_chunk_index(doc_hash)
+    if index is None:
+        raise FileNotFoundError(f"No chunk index for document {doc_hash}")
+    chunks = index.top_chunks(topic, k=TOPIC_CHUNKS)
+    questions = generate_questions_from_chunks(
+        chunks,
+        num_questions=num_questions,
+        on_progress=on_progress,
+        report=report,
+        focus_topic=topic,
+    ) or []
+    return attach_sources(normalize_topics(questions), doc_hash, index)
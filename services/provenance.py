@@ -0,0 +1,171 @@
+"""
+Question provenance: where in the study material each question came from.
+
+The pipeline writes each document's chunk text to data/texts/<doc_hash>.txt
+and tags every question with a "source": the document hash, the 1-based page
+range of its chunk, and the byte span of the passage around the answer in
+that file. read_passage() slices the passage out of a memory-mapped copy of
+the file, so the quiz can show it without re-opening the PDF, and
+questions_on_pages() answers the reverse lookup from pages to questions.
+Generating the same document again with other settings rewrites its text
+cache, so read_passage() checks that the chunk around the byte span still
+has the question's chunk_hash before trusting the offsets.
+"""
+import bisect
+import mmap
+import os
+import re
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from services.storage import BASE_DIR
+
+TEXT_CACHE_DIR = BASE_DIR / "texts"
+
+# Written between chunks in the text cache
+CHUNK_SEPARATOR = "\n\n"
+# Sentences of context kept on each side of the one that contains the answer
+CONTEXT_SENTENCES = 1
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_PAGE_INDEX_CACHE_SIZE = 8
+
+
+def text_cache_path(doc_hash: str) -> Path:
+    return TEXT_CACHE_DIR / f"{doc_hash}.txt"
+
+
+def save_text_cache(doc_hash: str, chunks: List[str]) -> List[Tuple[int, int]]:
+    """Write a document's chunks to its text cache; returns the byte span of each chunk."""
+    spans: List[Tuple[int, int]] = []
+    data = bytearray()
+    for chunk in chunks:
+        encoded = chunk.encode("utf-8")
+        spans.append((len(data), len(data) + len(encoded)))
+        data += encoded + CHUNK_SEPARATOR.encode("utf-8")
+    path = text_cache_path(doc_hash)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Worker threads may write the same document at once, so each call gets its own temp file
+    tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    tmp.write_bytes(bytes(data))
+    os.replace(tmp, path)
+    return spans
+
+
+def _answer_span(text: str, answer: str) -> Tuple[int, int]:
+    """Character span of the sentence mentioning the answer, with context; the whole text if it is not found."""
+    answer = answer.strip().lower()
+    if len(answer) < 3 or answer in ("true", "false"):
+        return 0, len(text)
+    position = text.lower().find(answer)
+    if position < 0:
+        return 0, len(text)
+    bounds = [0] + [m.end() for m in _SENTENCE_END.finditer(text)] + [len(text)]
+    sentence = bisect.bisect_right(bounds, position) - 1
+    start = bounds[max(0, sentence - CONTEXT_SENTENCES)]
+    end = bounds[min(len(bounds) - 1, sentence + 1 + CONTEXT_SENTENCES)]
+    return start, end
+
+
+def attach_sources(questions: List[Dict], doc_hash: str, index) -> List[Dict]:
+    """
+    Add "source" to questions whose chunk_hash is a chunk of `index`
+    (a services.retrieval.ChunkIndex saved with spans).
+    """
+    if not index.spans:
+        return questions
+    positions = {h: i for i, h in enumerate(index.hashes)}
+    for q in questions:
+        i = positions.get(q.get("chunk_hash"))
+        if i is None:
+            continue
+        first_page, last_page, chunk_start, _ = index.spans[i]
+        chunk = index.chunks[i]
+        start, end = _answer_span(chunk, str(q.get("answer", "")))
+        q["source"] = {
+            "doc_hash": doc_hash,
+            "pages": [first_page + 1, last_page + 1],
+            "start": chunk_start + len(chunk[:start].encode("utf-8")),
+            "end": chunk_start + len(chunk[:end].encode("utf-8")),
+        }
+    return questions
+
+
+@lru_cache(maxsize=32)
+def _mapped(path: str, mtime_ns: int) -> mmap.mmap:
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _chunk_hash_around(data: mmap.mmap, start: int, end: int) -> str:
+    """content_hash of the cached chunk holding bytes start..end (chunks contain no blank lines)."""
+    # utils.text_extraction loads pdfplumber, which the app does not otherwise need
+    from utils.text_extraction import content_hash
+
+    separator = CHUNK_SEPARATOR.encode("utf-8")
+    chunk_start = data.rfind(separator, 0, start)
+    chunk_start = 0 if chunk_start < 0 else chunk_start + len(separator)
+    chunk_end = data.find(separator, end)
+    chunk_end = len(data) if chunk_end < 0 else chunk_end
+    return content_hash(data[chunk_start:chunk_end].decode("utf-8", errors="replace"))
+
+
+def read_passage(source: Optional[Dict], chunk_hash: Optional[str] = None) -> str:
+    """
+    The passage a question was generated from, or "" if its text cache is
+    gone or, given the question's `chunk_hash`, no longer holds its chunk at
+    those offsets.
+    """
+    if not source:
+        return ""
+    path = text_cache_path(source["doc_hash"])
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return ""
+    if stat.st_size == 0 or source["end"] > stat.st_size:
+        return ""
+    data = _mapped(str(path.resolve()), stat.st_mtime_ns)
+    if chunk_hash and _chunk_hash_around(data, source["start"], source["end"]) != chunk_hash:
+        return ""
+    return data[source["start"] : source["end"]].decode("utf-8", errors="replace")
+
+
+def build_page_index(bank: Sequence[Dict]) -> Dict[Tuple[str, int], List[int]]:
+    """(doc_hash, page) -> positions in `bank` of the questions from that page."""
+    index: Dict[Tuple[str, int], List[int]] = {}
+    for position, q in enumerate(bank):
+        source = q.get("source")
+        if not source:
+            continue
+        first, last = source["pages"]
+        for page in range(first, last + 1):
+            index.setdefault((source["doc_hash"], page), []).append(position)
+    return index
+
+
+_page_index_cache: "OrderedDict[int, Tuple[Sequence[Dict], Dict]]" = OrderedDict()
+
+
+def questions_on_pages(bank: Sequence[Dict], doc_hash: str, first: int, last: int) -> List[int]:
+    """
+    Positions in `bank` of the questions from pages first..last (1-based).
+    The page index is cached per shared read-only bank, like
+    models.quiz_assembler.index_for.
+    """
+    cached = _page_index_cache.get(id(bank))
+    if cached is not None and cached[0] is bank:
+        _page_index_cache.move_to_end(id(bank))
+        index = cached[1]
+    else:
+        index = build_page_index(bank)
+        _page_index_cache[id(bank)] = (bank, index)
+        while len(_page_index_cache) > _PAGE_INDEX_CACHE_SIZE:
+            _page_index_cache.popitem(last=False)
+    found = set()
+    for page in range(first, last + 1):
+        found.update(index.get((doc_hash, page), ()))
+    return sorted(found)
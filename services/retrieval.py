@@ -0,0 +1,156 @@
+"""
+BM25 retrieval over the chunks of ingested documents.
+
+The generation pipeline stores each document's chunks with an inverted
+index under data/chunks/<doc_hash>.json. Follow-up requests such as "10 more
+questions on topic X" then send only the best-matching chunks to the LLM
+instead of running the whole document again.
+"""
+import json
+import math
+import os
+import re
+import uuid
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from services.storage import BASE_DIR
+from services.topics import stem_word
+from utils.instrumentation import timed
+from utils.text_extraction import content_hash
+
+CHUNK_INDEX_DIR = BASE_DIR / "chunks"
+
+# Standard BM25 parameters: term-frequency saturation and length normalisation
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    """a an and are as at be by for from has have in is it its of on or that the this
+    to was were which with""".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem_word(w) for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+class ChunkIndex:
+    """
+    Chunks of one document with a term -> [(chunk, term frequency)] index,
+    the content hashes of its chunks and pages (see services.revisions), and
+    per chunk its (first page, last page, start, end) in the document's text
+    cache (see services.provenance).
+    """
+
+    def __init__(
+        self,
+        chunks: List[str],
+        lengths: List[int],
+        postings: Dict[str, List[List[int]]],
+        page_hashes: Sequence[str] = (),
+        spans: Sequence[Sequence[int]] = (),
+    ):
+        self.chunks = chunks
+        self.lengths = lengths
+        self.postings = postings
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        self.hashes = [content_hash(chunk) for chunk in chunks]
+        self.page_hashes = list(page_hashes)
+        self.spans = [list(span) for span in spans]
+
+    @classmethod
+    def from_chunks(
+        cls,
+        chunks: List[str],
+        page_hashes: Sequence[str] = (),
+        spans: Sequence[Sequence[int]] = (),
+    ) -> "ChunkIndex":
+        lengths: List[int] = []
+        postings: Dict[str, List[List[int]]] = {}
+        for position, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                postings.setdefault(term, []).append([position, count])
+        return cls(list(chunks), lengths, postings, page_hashes, spans)
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[int, float]]:
+        """Best `k` (chunk position, score) pairs for `query`; chunks sharing no term are left out."""
+        n = len(self.chunks)
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[position] / self.avg_length)
+                scores[position] = scores.get(position, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+    def top_chunks(self, query: str, k: int = 3) -> List[str]:
+        """Text of the best chunks for `query`, in document order."""
+        return [self.chunks[position] for position, _ in sorted(self.search(query, k))]
+
+    def to_dict(self) -> Dict:
+        return {
+            "chunks": self.chunks,
+            "lengths": self.lengths,
+            "postings": self.postings,
+            "page_hashes": self.page_hashes,
+            "spans": self.spans,
+        }
+
+
+def chunk_index_path(doc_hash: str) -> Path:
+    return CHUNK_INDEX_DIR / f"{doc_hash}.json"
+
+
+def has_chunk_index(doc_hash: Optional[str]) -> bool:
+    return bool(doc_hash) and chunk_index_path(doc_hash).exists()
+
+
+@timed("save_chunk_index")
+def save_chunk_index(
+    doc_hash: str,
+    chunks: List[str],
+    page_hashes: Sequence[str] = (),
+    spans: Sequence[Sequence[int]] = (),
+) -> ChunkIndex:
+    """Index a document's chunks and write the index atomically."""
+    index = ChunkIndex.from_chunks(chunks, page_hashes, spans)
+    path = chunk_index_path(doc_hash)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Worker threads may write the same document at once, so each call gets its own temp file
+    tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return index
+
+
+@lru_cache(maxsize=16)
+def _load_index(path: str, mtime_ns: int) -> ChunkIndex:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return ChunkIndex(
+        data["chunks"],
+        data["lengths"],
+        data["postings"],
+        data.get("page_hashes", ()),
+        data.get("spans", ()),
+    )
+
+
+def load_chunk_index(doc_hash: str) -> Optional[ChunkIndex]:
+    """A document's chunk index, cached until the file changes; None if it was never indexed."""
+    path = chunk_index_path(doc_hash)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return _load_index(str(path.resolve()), stat.st_mtime_ns)
@@ -0,0 +1,121 @@
+"""
+Incremental regeneration of revised documents.
+
+Every generated bank is recorded under its document key together with the
+document's content hash. The key is the file name scoped to where it came
+from (a browser session, an ingest directory), so equal file names from
+different users are separate documents. When a new version of the same
+document is generated with the same settings, its chunks are compared by content hash with the
+previous version's chunk index: questions from unchanged chunks are carried
+over as they are, so attempt history still matches them, questions from
+chunks that no longer exist are retired, and only new or edited chunks are
+sent to the LLM.
+"""
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+
+from services.retrieval import load_chunk_index
+from services.storage import BASE_DIR, load_shared_questions
+
+DOCUMENTS_DB_PATH = BASE_DIR / "documents.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    doc_hash TEXT NOT NULL,
+    bank_path TEXT NOT NULL,
+    settings TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Columns added to the documents table after it was first created
+_ADDED_COLUMNS = {"settings": "TEXT"}
+
+
+class PreviousVersion(NamedTuple):
+    doc_hash: str
+    bank: Sequence[Dict]
+    chunk_hashes: FrozenSet[str]
+    page_hashes: FrozenSet[str]
+
+
+def document_key(scope: str, name: str) -> str:
+    """Key under which versions of the file `name` from `scope` are recorded."""
+    return f"{scope}/{name}"
+
+
+def _connect() -> sqlite3.Connection:
+    DOCUMENTS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DOCUMENTS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+    for column, decl in _ADDED_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE documents ADD COLUMN {column} {decl}")
+    return conn
+
+
+def _settings_json(settings: Dict) -> str:
+    return json.dumps(settings, sort_keys=True)
+
+
+def record_version(name: str, doc_hash: str, bank_path: str, settings: Dict):
+    """Make this bank, generated with `settings`, the latest version of the document with key `name`."""
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO documents (name, doc_hash, bank_path, settings, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (name, doc_hash, bank_path, _settings_json(settings), time.time()),
+        )
+    finally:
+        conn.close()
+
+
+def previous_version(name: str, doc_hash: str, settings: Dict) -> Optional[PreviousVersion]:
+    """
+    The latest recorded version of the document with key `name` to revise
+    into `doc_hash` with `settings`, or None if the document should be
+    generated in full: never generated, the same content (a rerun with other
+    settings), generated with other settings, its bank or chunk index is
+    gone, or its questions predate chunk provenance.
+    """
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM documents WHERE name = ?", (name,)).fetchone()
+    finally:
+        conn.close()
+    if row is None or row["doc_hash"] == doc_hash or row["settings"] != _settings_json(settings):
+        return None
+    index = load_chunk_index(row["doc_hash"])
+    bank = load_shared_questions(Path(row["bank_path"]))
+    if index is None or not bank or not any(q.get("chunk_hash") for q in bank):
+        return None
+    return PreviousVersion(
+        row["doc_hash"], bank, frozenset(index.hashes), frozenset(index.page_hashes)
+    )
+
+
+def plan_revision(
+    previous: PreviousVersion,
+    chunk_hashes: List[str],
+    page_hashes: List[str],
+) -> Tuple[List[Dict], List[int], Dict]:
+    """(questions to keep, positions of the chunks to generate for, counts for the report)."""
+    current = set(chunk_hashes)
+    kept = [dict(q) for q in previous.bank if q.get("chunk_hash") in current]
+    todo = [i for i, h in enumerate(chunk_hashes) if h not in previous.chunk_hashes]
+    stats = {
+        "pages_changed": sum(1 for h in page_hashes if h not in previous.page_hashes),
+        "chunks_reused": len(chunk_hashes) - len(todo),
+        "chunks_regenerated": len(todo),
+        "questions_kept": len(kept),
+        "questions_retired": len(previous.bank) - len(kept),
+    }
+    return kept, todo, stats
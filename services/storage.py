@@ -1,25 +1,38 @@
 import json
-from typing import List, Dict
+import shutil
+import time
+import uuid
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence
 from pathlib import Path
 
+from models.question_record import compact_questions
+from utils.instrumentation import timed
+
 BASE_DIR = Path("data")
 QUESTIONS_PATH = BASE_DIR / "questions.json"
+SESSIONS_DIR = BASE_DIR / "sessions"
+
+# Session folders untouched for this long are removed by cleanup_stale_sessions
+SESSION_MAX_AGE = 24 * 3600
 
 
-def save_questions_json(questions: List[Dict]):
-    BASE_DIR.mkdir(parents=True, exist_ok=True)
-    with open(QUESTIONS_PATH, "w", encoding="utf-8") as f:
+@timed("save_questions_json")
+def save_questions_json(questions: List[Dict], path: Optional[Path] = None):
+    path = Path(path or QUESTIONS_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
         json.dump(questions, f, ensure_ascii=False, indent=2)
 
 
-def load_questions_json() -> List[Dict]:
-    # Debug line: prints the path and whether it exists
-    print("DEBUG QUESTIONS_PATH:", QUESTIONS_PATH, QUESTIONS_PATH.exists())
+@timed("load_questions_json")
+def load_questions_json(path: Optional[Path] = None) -> List[Dict]:
+    path = Path(path or QUESTIONS_PATH)
 
-    if not QUESTIONS_PATH.exists():
+    if not path.exists():
         return []  # file does not exist
 
-    with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
 
     # Safety: always return a list
@@ -27,3 +40,69 @@ def load_questions_json() -> List[Dict]:
         return []
 
     return data
+
+
+@lru_cache(maxsize=32)
+def _load_shared(path: str, mtime_ns: int, size: int) -> Sequence[Dict]:
+    if path.endswith(".arrow"):
+        # Imported here so JSON-only callers do not load pyarrow
+        from services.bank_format import load_bank
+
+        return load_bank(Path(path))
+    return compact_questions(load_questions_json(Path(path)))
+
+
+def load_shared_questions(path: Optional[Path] = None) -> Sequence[Dict]:
+    """
+    Load a read-only question bank through a process-wide cache, so all
+    sessions quizzing on the same bank share one copy in memory.
+    JSON banks load as a tuple of compact read-only records that read like
+    the question dicts (see models.question_record); `.arrow` banks are
+    memory-mapped (see services.bank_format) and build each dict on access.
+    The cache entry is replaced when the file changes on disk.
+    Callers must not mutate the returned questions.
+    """
+    path = Path(path or QUESTIONS_PATH)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return ()
+    return _load_shared(str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def session_dir(session_id: str) -> Path:
+    return SESSIONS_DIR / session_id
+
+
+def save_session_upload(data: bytes, session_id: str, suffix: str = ".pdf") -> Path:
+    """Write an upload to a unique file inside the session's namespace."""
+    upload_dir = session_dir(session_id) / "uploads"
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    path = upload_dir / f"{uuid.uuid4().hex}{suffix}"
+    path.write_bytes(data)
+    return path
+
+
+def discard_upload(path):
+    Path(path).unlink(missing_ok=True)
+
+
+def cleanup_stale_sessions(max_age: float = SESSION_MAX_AGE):
+    """Remove session folders (and any leftover uploads) that are no longer used."""
+    if not SESSIONS_DIR.exists():
+        return
+    cutoff = time.time() - max_age
+    for folder in SESSIONS_DIR.iterdir():
+        try:
+            newest = max(
+                [folder.stat().st_mtime]
+                + [p.stat().st_mtime for p in folder.rglob("*")]
+            )
+        except FileNotFoundError:
+            continue
+        if newest < cutoff:
+            shutil.rmtree(folder, ignore_errors=True)
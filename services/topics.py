@@ -0,0 +1,186 @@
+"""
+Canonical topic taxonomy.
+
+The LLM writes free-text topics, so "Photosynthesis", "photosynthesis" and
+"Photosynthetic process" would otherwise be three groups. normalize_topics()
+folds each topic (case, punctuation, filler words, plural and -ic/-sis
+endings), matches it against the known vocabulary by that key, and tags
+the question with the canonical label and a small integer topic_id. Keys
+must be equal: near-identical words such as "Nucleus" and "Nucleolus" are
+often different concepts.
+
+The vocabulary lives in SQLite so the app, the job worker and ingest
+processes hand out the same ids; lookups are cached in-process, and only
+rows added since the last read are loaded from the database.
+"""
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+from services.storage import BASE_DIR
+from utils.instrumentation import incr, timed
+
+TOPICS_DB_PATH = BASE_DIR / "topics.db"
+
+UNKNOWN_TOPIC = "Unknown"
+
+_FILLER_WORDS = frozenset(
+    """a an and the of in on to for with its process processes introduction intro
+    overview basics basic concept concepts principles fundamentals""".split()
+)
+_WORD = re.compile(r"[a-z0-9]+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    label TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    topic_id INTEGER NOT NULL
+);
+"""
+
+_lock = threading.Lock()
+# alias (lowercased raw topic) -> id, id -> (key, label) and key -> id; filled lazily
+_aliases: Dict[str, int] = {}
+_topics: Dict[int, Tuple[str, str]] = {}
+_keys: Dict[str, int] = {}
+# Highest topic id and alias rowid read so far
+_seen = {"topic": 0, "alias": 0}
+
+
+def _connect() -> sqlite3.Connection:
+    TOPICS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(TOPICS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def stem_word(word: str) -> str:
+    """Tiny suffix folding: plurals first, then -ical/-ic/-sis to a shared stem."""
+    if len(word) > 4:
+        if word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif word.endswith(("sses", "xes", "ches", "shes")):
+            word = word[:-2]
+        elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]
+    if len(word) > 6:
+        if word.endswith("ical"):
+            word = word[:-4]
+        elif word.endswith("ic"):
+            word = word[:-2]
+        elif word.endswith("sis"):
+            word = word[:-3] + "t"
+    return word
+
+
+@lru_cache(maxsize=4096)
+def fold_topic(topic: str) -> str:
+    """Matching key for a topic: sorted stems of its meaningful words."""
+    words = _WORD.findall(str(topic).lower())
+    meaningful = [w for w in words if w not in _FILLER_WORDS] or words
+    return " ".join(sorted({stem_word(w) for w in meaningful}))
+
+
+def _refresh(conn: sqlite3.Connection):
+    """Load the topics and aliases added since the last call."""
+    for row in conn.execute(
+        "SELECT id, key, label FROM topics WHERE id > ? ORDER BY id", (_seen["topic"],)
+    ):
+        _topics[row["id"]] = (row["key"], row["label"])
+        _keys[row["key"]] = row["id"]
+        _seen["topic"] = row["id"]
+    # An alias always maps to the topic with its folded key, so a row read
+    # once never needs reading again; a skipped one is mapped by topic_id()
+    for row in conn.execute(
+        "SELECT rowid, alias, topic_id FROM aliases WHERE rowid > ? ORDER BY rowid",
+        (_seen["alias"],),
+    ):
+        _seen["alias"] = row["rowid"]
+        topic = _topics.get(row["topic_id"])
+        # Aliases saved by the old similarity matching may point at another
+        # concept; skipped here, topic_id() maps them again and replaces them
+        if topic is not None and fold_topic(row["alias"]) == topic[0]:
+            _aliases[row["alias"]] = row["topic_id"]
+
+
+def topic_id(topic: str) -> int:
+    """Id of the canonical topic for a raw topic string, adding it if new."""
+    label = str(topic or "").strip() or UNKNOWN_TOPIC
+    alias = label.lower()
+    tid = _aliases.get(alias)
+    if tid is not None:
+        return tid
+
+    with _lock:
+        conn = _connect()
+        try:
+            # Another process may have added it since our cache was filled
+            conn.execute("BEGIN IMMEDIATE")
+            _refresh(conn)
+            tid = _aliases.get(alias)
+            if tid is None:
+                key = fold_topic(label)
+                tid = _keys.get(key)
+                if tid is None:
+                    tid = conn.execute(
+                        "INSERT INTO topics (key, label) VALUES (?, ?)", (key, label)
+                    ).lastrowid
+                    _topics[tid] = (key, label)
+                    _keys[key] = tid
+                    incr("topics_created")
+                conn.execute(
+                    "INSERT OR REPLACE INTO aliases (alias, topic_id) VALUES (?, ?)", (alias, tid)
+                )
+                _aliases[alias] = tid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+    return tid
+
+
+def topic_label(tid: int) -> str:
+    if tid not in _topics:
+        with _lock:
+            conn = _connect()
+            try:
+                _refresh(conn)
+            finally:
+                conn.close()
+    return _topics.get(tid, ("", UNKNOWN_TOPIC))[1]
+
+
+def topic_labels() -> Dict[int, str]:
+    """Every known topic id with its canonical label."""
+    with _lock:
+        conn = _connect()
+        try:
+            _refresh(conn)
+        finally:
+            conn.close()
+        return {tid: label for tid, (_, label) in sorted(_topics.items())}
+
+
+def register_topics(labels: Iterable[str]) -> List[int]:
+    """Seed the vocabulary, e.g. with a course's chapter titles."""
+    return [topic_id(label) for label in labels]
+
+
+@timed("normalize_topics")
+def normalize_topics(questions: List[Dict]) -> List[Dict]:
+    """Replace each question's topic with its canonical label and add topic_id."""
+    for q in questions:
+        tid = topic_id(q.get("topic"))
+        q["topic_id"] = tid
+        q["topic"] = topic_label(tid)
+    return questions
@@ -0,0 +1,169 @@
+"""
+Token usage ledger for LLM calls, with rollups and per-session budgets.
+
+Calls are tagged with the session and document they were made for through
+usage_context(); the tags follow the calling thread, so record_usage() must
+run where the call result is consumed rather than inside the batcher.
+"""
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from services.storage import BASE_DIR
+
+USAGE_DB_PATH = BASE_DIR / "usage.db"
+
+CALL_GENERATION = "generation"
+CALL_DIFFICULTY = "difficulty"
+
+# Default per-session token budget; 0 means unlimited
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("SMARTQUIZZER_TOKEN_BUDGET", "0"))
+
+ROLLUP_KEYS = ("session_id", "doc_hash", "call_type", "model")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    ts REAL NOT NULL,
+    session_id TEXT,
+    doc_hash TEXT,
+    call_type TEXT NOT NULL,
+    model TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS usage_session ON usage (session_id);
+CREATE INDEX IF NOT EXISTS usage_doc ON usage (doc_hash);
+CREATE TABLE IF NOT EXISTS budgets (
+    session_id TEXT PRIMARY KEY,
+    token_limit INTEGER NOT NULL
+);
+"""
+
+_tags: contextvars.ContextVar = contextvars.ContextVar("usage_tags", default={})
+
+
+class BudgetExceeded(Exception):
+    """Raised when a session has used up its token budget."""
+
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    One connection per thread, kept open: a usage row is written for every
+    LLM call, so opening a connection and syncing to disk each time would
+    cost more than the insert itself.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        USAGE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(USAGE_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL stays consistent with NORMAL; a crash may lose only the last rows
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def usage_context(session_id: Optional[str] = None, doc_hash: Optional[str] = None):
+    """Tag every LLM call made inside the block with a session and document."""
+    tags = dict(_tags.get())
+    if session_id is not None:
+        tags["session_id"] = session_id
+    if doc_hash is not None:
+        tags["doc_hash"] = doc_hash
+    token = _tags.set(tags)
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def current_session_id() -> Optional[str]:
+    return _tags.get().get("session_id")
+
+
+def record_usage(call_type: str, prompt_tokens: int, completion_tokens: int, model: Optional[str] = None):
+    tags = _tags.get()
+    conn = _connect()
+    conn.execute(
+        "INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            time.time(),
+            tags.get("session_id"),
+            tags.get("doc_hash"),
+            call_type,
+            model,
+            int(prompt_tokens or 0),
+            int(completion_tokens or 0),
+        ),
+    )
+
+
+def session_tokens(session_id: str) -> int:
+    conn = _connect()
+    row = conn.execute(
+        "SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) FROM usage WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    return row[0]
+
+
+def set_budget(session_id: str, token_limit: int):
+    conn = _connect()
+    conn.execute(
+        "INSERT OR REPLACE INTO budgets (session_id, token_limit) VALUES (?, ?)",
+        (session_id, int(token_limit)),
+    )
+
+
+def get_budget(session_id: str) -> int:
+    """Token limit for a session (0 = unlimited)."""
+    conn = _connect()
+    row = conn.execute(
+        "SELECT token_limit FROM budgets WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    return row["token_limit"] if row is not None else DEFAULT_TOKEN_BUDGET
+
+
+def check_budget(session_id: Optional[str] = None):
+    """
+    Raise BudgetExceeded if the session (by default the one in the current
+    usage_context) has no tokens left.
+    """
+    session_id = session_id or current_session_id()
+    if session_id is None:
+        return
+    limit = get_budget(session_id)
+    if limit and session_tokens(session_id) >= limit:
+        raise BudgetExceeded(f"Token budget of {limit} exhausted for session {session_id}")
+
+
+def usage_rollup(group_by: str = "doc_hash", since: Optional[float] = None) -> List[Dict]:
+    """Total calls and tokens grouped by one of ROLLUP_KEYS, largest first."""
+    if group_by not in ROLLUP_KEYS:
+        raise ValueError(f"group_by must be one of {ROLLUP_KEYS}")
+    conn = _connect()
+    rows = conn.execute(
+        f"""
+        SELECT {group_by} AS key,
+               COUNT(*) AS calls,
+               SUM(prompt_tokens) AS prompt_tokens,
+               SUM(completion_tokens) AS completion_tokens,
+               SUM(prompt_tokens + completion_tokens) AS total_tokens
+        FROM usage
+        WHERE ts >= ?
+        GROUP BY {group_by}
+        ORDER BY total_tokens DESC
+        """,
+        (since or 0,),
+    ).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,119 @@
+"""
+Once-per-process warmup.
+
+The first sessions after a restart would otherwise pay for every cold
+start: parsing and indexing the question banks, Plotly's first figure,
+starting the generation worker and its model setup. start() runs those
+steps on a background thread and returns a Warmup whose `ready`
+event the app checks to show "warming up" instead of stalling; the app
+shares it across sessions through st.cache_resource. warm_worker() does
+the same for the generation worker before it takes its first job.
+"""
+import os
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+from utils import instrumentation
+
+# Set SMARTQUIZZER_WARMUP=0 to skip warming (the app is then ready at once)
+WARMUP_ENABLED = os.environ.get("SMARTQUIZZER_WARMUP", "1") != "0"
+# Recently finished job banks loaded into the shared bank cache
+WARMUP_RECENT_BANKS = 5
+
+
+class Warmup:
+    """Progress of one process's warmup: per-step seconds, readiness and the first question served."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready = threading.Event()
+        self.steps: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.first_question_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def run(self, steps: List[Callable[[], None]]):
+        try:
+            for step in steps:
+                start = time.perf_counter()
+                step()
+                self.steps[step.__name__] = time.perf_counter() - start
+                instrumentation.observe(f"warmup.{step.__name__}.seconds", self.steps[step.__name__])
+        except Exception:
+            # A failed step only means the first user pays for it again
+            self.error = traceback.format_exc()
+        finally:
+            self.ready.set()
+
+    def record_first_question(self):
+        """Time from the start of warmup to the first question this process served."""
+        with self._lock:
+            if self.first_question_seconds is not None:
+                return
+            self.first_question_seconds = time.time() - self.started_at
+        instrumentation.observe("time_to_first_question.cold_seconds", self.first_question_seconds)
+
+
+def load_banks():
+    """Parse the default bank and the most recent job banks into the shared cache and index them."""
+    from models.quiz_assembler import index_for
+    from services.jobs import recent_result_paths
+    from services.storage import load_shared_questions
+
+    for path in [None, *recent_result_paths(WARMUP_RECENT_BANKS)]:
+        bank = load_shared_questions(path)
+        if bank:
+            index_for(bank)
+
+
+def render_first_figure():
+    """Plotly loads its templates and validators on the first figure."""
+    import plotly.express as px
+
+    px.line(x=[0, 1], y=[0, 1]).to_json()
+
+
+def start_worker():
+    from services.jobs import ensure_worker_running
+
+    ensure_worker_running()
+
+
+def start() -> Warmup:
+    """Warm this process on a background thread; `ready` is set when done."""
+    warmup = Warmup()
+    if not WARMUP_ENABLED:
+        warmup.ready.set()
+        return warmup
+    steps = [load_banks, render_first_figure, start_worker]
+    threading.Thread(target=warmup.run, args=(steps,), name="warmup", daemon=True).start()
+    return warmup
+
+
+def import_pipeline():
+    # Creates the InferenceClient and loads pdfplumber and the prompt modules
+    import services.pipeline  # noqa: F401
+
+
+def load_local_model():
+    """Load the local model and encode the shared start of the question prompts."""
+    from models.local_backend import PREFIX_CACHE_ENABLED, get_local_model
+    from models.question_generator import LLM_BACKEND, MODEL_NAME, QUESTION_GEN_PREFIX, SYSTEM_PROMPT
+
+    if LLM_BACKEND == "local":
+        model = get_local_model(MODEL_NAME)
+        model.load()
+        if PREFIX_CACHE_ENABLED:
+            model.prefix_cache(SYSTEM_PROMPT, QUESTION_GEN_PREFIX)
+
+
+def warm_worker() -> Warmup:
+    """Warm the generation worker in the calling thread, before it takes its first job."""
+    warmup = Warmup()
+    if WARMUP_ENABLED:
+        warmup.run([import_pipeline, load_local_model])
+    else:
+        warmup.ready.set()
+    return warmup
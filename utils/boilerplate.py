@@ -0,0 +1,115 @@
+"""
+Removes text that repeats on every page of a document (running headers,
+footers, page numbers, copyright lines) before it is chunked for the LLM,
+and optionally drops table-of-contents and index pages.
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from utils.instrumentation import incr, timed
+
+# Lines at the top and bottom of a page that may be a header or footer
+EDGE_LINES = 3
+# A line is boilerplate when it appears at the same page edge on at least
+# this share of pages (0.4 still catches headers alternating odd/even pages)
+MIN_REPEAT_RATIO = 0.4
+# Shorter documents do not have enough pages to tell what repeats
+MIN_PAGES = 3
+
+# TOC pages are searched for near the start and index pages near the end
+EDGE_PAGE_RATIO = 0.1
+MIN_EDGE_PAGES = 5
+# Share of a page's lines that must look like TOC / index entries
+MIN_ENTRY_RATIO = 0.5
+MIN_ENTRY_LINES = 5
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+_COPYRIGHT = re.compile(r"©|\(c\)\s*\d{4}|\bcopyright\s+\d{4}|all rights reserved", re.IGNORECASE)
+# "2.1 Photosynthesis ........ 34"
+_TOC_ENTRY = re.compile(r"\S.*?(?:\.{2,}|…|\s)\s*\d{1,4}\s*$")
+# "Photosynthesis, 34, 56-58"
+_INDEX_ENTRY = re.compile(r"^[^\d\s].*?,\s*\d+(?:\s*[-–]\s*\d+)?(?:\s*,\s*\d+(?:\s*[-–]\s*\d+)?)*\s*$")
+
+
+def _line_key(line: str) -> int:
+    """Hash of a line with numbers masked, so "Page 3" and "Page 4" match."""
+    return hash(_SPACES.sub(" ", _DIGITS.sub("#", line.strip().lower())))
+
+
+def _edge_positions(num_lines: int) -> List[Tuple[int, str]]:
+    """
+    (line index, zone) pairs for the first and last EDGE_LINES lines. Lines
+    are matched per zone rather than per exact row, so a footer still matches
+    when a page has an extra line under it.
+    """
+    top = [(i, "top") for i in range(min(EDGE_LINES, num_lines))]
+    bottom = [(num_lines - 1 - j, "bottom") for j in range(min(EDGE_LINES, num_lines))]
+    return top + bottom
+
+
+def _entry_ratio(lines: List[str], pattern: re.Pattern) -> float:
+    lines = [line for line in lines if line.strip()]
+    if len(lines) < MIN_ENTRY_LINES:
+        return 0.0
+    return sum(1 for line in lines if pattern.match(line.strip())) / len(lines)
+
+
+def count_tokens(text: str) -> int:
+    """Token estimate in words, the same unit split_into_chunks uses."""
+    return len(text.split())
+
+
+@timed("strip_boilerplate")
+def strip_boilerplate(
+    pages: List[str], drop_toc: bool = False, drop_index: bool = False
+) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Remove repeated header/footer lines and copyright notices from each page.
+    Returns the cleaned pages and counts of what was removed, including the
+    estimated number of prompt tokens saved.
+    """
+    page_lines = [page.splitlines() for page in pages]
+
+    # Count each (zone, line) pair once per page
+    seen: Counter = Counter()
+    for lines in page_lines:
+        seen.update({(zone, _line_key(lines[i])) for i, zone in _edge_positions(len(lines))})
+    min_pages = max(2, int(len(pages) * MIN_REPEAT_RATIO))
+
+    stats = Counter()
+    cleaned_pages: List[List[str]] = []
+    for lines in page_lines:
+        drop = set()
+        if len(page_lines) >= MIN_PAGES:
+            for i, zone in _edge_positions(len(lines)):
+                if lines[i].strip() and seen[(zone, _line_key(lines[i]))] >= min_pages:
+                    drop.add(i)
+        stats["boilerplate_lines"] += len(drop)
+        for i, line in enumerate(lines):
+            if i not in drop and _COPYRIGHT.search(line):
+                drop.add(i)
+                stats["copyright_lines"] += 1
+        cleaned_pages.append([line for i, line in enumerate(lines) if i not in drop])
+
+    edge_pages = max(MIN_EDGE_PAGES, int(len(pages) * EDGE_PAGE_RATIO))
+    for index, lines in enumerate(cleaned_pages):
+        if drop_toc and index < edge_pages and _entry_ratio(lines, _TOC_ENTRY) >= MIN_ENTRY_RATIO:
+            stats["toc_pages"] += 1
+            cleaned_pages[index] = []
+        elif (
+            drop_index
+            and index >= len(pages) - edge_pages
+            and _entry_ratio(lines, _INDEX_ENTRY) >= MIN_ENTRY_RATIO
+        ):
+            stats["index_pages"] += 1
+            cleaned_pages[index] = []
+
+    result = ["\n".join(lines) for lines in cleaned_pages]
+    tokens_before = sum(count_tokens(page) for page in pages)
+    tokens_after = sum(count_tokens(page) for page in result)
+    stats["tokens_before"] = tokens_before
+    stats["tokens_saved"] = tokens_before - tokens_after
+    incr("boilerplate_tokens_saved", stats["tokens_saved"])
+    return result, dict(stats)
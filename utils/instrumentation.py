@@ -0,0 +1,179 @@
+"""
+Lightweight timing spans and counters for the generation pipeline.
+
+Enabled with SMARTQUIZZER_METRICS=1. When disabled, span() returns a shared
+no-op context manager and incr()/observe() return immediately.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+METRICS_DIR = Path("data") / "metrics"
+METRICS_JSONL_PATH = METRICS_DIR / "metrics.jsonl"
+
+# Only the most recent observations per metric are kept for percentiles
+MAX_OBSERVATIONS = 10000
+
+_enabled = os.environ.get("SMARTQUIZZER_METRICS", "").lower() in ("1", "true", "yes", "on")
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Metrics:
+    """Thread-safe in-process store of counters and timing observations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.observations: Dict[str, deque] = defaultdict(lambda: deque(maxlen=MAX_OBSERVATIONS))
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self.observations[name].append(value)
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name + ".seconds", time.perf_counter() - start)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+            observations = {name: sorted(values) for name, values in self.observations.items()}
+        timings = {
+            name: {
+                "count": len(values),
+                "sum": sum(values),
+                "p50": _percentile(values, 50),
+                "p90": _percentile(values, 90),
+                "p99": _percentile(values, 99),
+                "max": values[-1] if values else 0.0,
+            }
+            for name, values in observations.items()
+        }
+        return {"counters": counters, "timings": timings}
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.observations.clear()
+
+
+metrics = Metrics()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def span(name: str):
+    """Time a block as `<name>.seconds`; a no-op when metrics are disabled."""
+    if not _enabled:
+        return _NULL_SPAN
+    return metrics.span(name)
+
+
+def timed(name: str):
+    """Decorator form of span() for whole pipeline stages."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with metrics.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def incr(name: str, value: float = 1):
+    if _enabled:
+        metrics.incr(name, value)
+
+
+def observe(name: str, value: float):
+    if _enabled:
+        metrics.observe(name, value)
+
+
+def _prom_name(name: str) -> str:
+    return "smartquizzer_" + "".join(ch if ch.isalnum() else "_" for ch in name)
+
+
+def to_prometheus(summary: Dict) -> str:
+    lines = []
+    for name, value in sorted(summary["counters"].items()):
+        lines.append(f"# TYPE {_prom_name(name)} counter")
+        lines.append(f"{_prom_name(name)} {value}")
+    for name, stats in sorted(summary["timings"].items()):
+        prom = _prom_name(name)
+        lines.append(f"# TYPE {prom} summary")
+        for key, quantile in (("p50", "0.5"), ("p90", "0.9"), ("p99", "0.99")):
+            lines.append(f'{prom}{{quantile="{quantile}"}} {stats[key]}')
+        lines.append(f"{prom}_sum {stats['sum']}")
+        lines.append(f"{prom}_count {stats['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def flush(source: str):
+    """
+    Append a snapshot of this process's metrics to metrics.jsonl and rewrite
+    `<source>.prom` in Prometheus text format.
+    """
+    if not _enabled:
+        return
+    summary = metrics.summary()
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(METRICS_JSONL_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts": time.time(), "source": source, **summary}) + "\n")
+    (METRICS_DIR / f"{source}.prom").write_text(to_prometheus(summary), encoding="utf-8")
+
+
+def latest_snapshots(max_lines: int = 200) -> Dict[str, Dict]:
+    """Most recent flushed snapshot per source, read from metrics.jsonl."""
+    if not METRICS_JSONL_PATH.exists():
+        return {}
+    with open(METRICS_JSONL_PATH, "r", encoding="utf-8") as f:
+        lines = deque(f, maxlen=max_lines)
+    snapshots: Dict[str, Dict] = {}
+    for line in lines:
+        try:
+            snapshot = json.loads(line)
+        except ValueError:
+            continue
+        snapshots[snapshot.get("source", "unknown")] = snapshot
+    return snapshots
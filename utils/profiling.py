@@ -0,0 +1,145 @@
+"""
+Opt-in cProfile profiles of app reruns and slow pipeline calls.
+
+SMARTQUIZZER_PROFILE takes a comma-separated list of targets: "rerun" (every
+run of app.py), "generation" (generate_questions_from_chunks, which every
+bank and topic job goes through), "extraction" (extract_pages_from_pdf) and
+"analytics" (the services.analytics functions), or "all". Each profile is saved to data/profiles/ as
+<timestamp>-<name>.prof, for pstats or snakeviz, next to a .txt report of
+the top functions by cumulative time.
+
+When a target is off, profiled() returns the function itself and app.py
+only calls run_profiled_rerun() behind a PROFILE_RERUNS check, so nothing is
+added to the code path. A call made while its thread is
+already being profiled (e.g. analytics during a profiled rerun) shows up in
+the outer profile instead of getting its own.
+"""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+PROFILES_DIR = Path("data") / "profiles"
+
+TARGETS = ("rerun", "generation", "extraction", "analytics")
+# Functions listed in each .txt report
+REPORT_TOP_FUNCTIONS = 30
+# Oldest profiles are deleted beyond this many (.prof files)
+MAX_SAVED_PROFILES = 500
+
+
+def _targets_from_env() -> frozenset:
+    raw = os.environ.get("SMARTQUIZZER_PROFILE", "").lower()
+    names = {name.strip() for name in raw.split(",") if name.strip()}
+    if names & {"1", "true", "yes", "on", "all"}:
+        return frozenset(TARGETS)
+    return frozenset(names & set(TARGETS))
+
+
+ENABLED_TARGETS = _targets_from_env()
+PROFILE_RERUNS = "rerun" in ENABLED_TARGETS
+
+_local = threading.local()
+_save_lock = threading.Lock()
+
+
+def _start() -> Optional[cProfile.Profile]:
+    """A running profiler for this thread, or None if the thread already has one."""
+    if getattr(_local, "profile", None) is not None:
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Python 3.12+ allows one profiler per process; another thread has it
+        return None
+    _local.profile = profile
+    return profile
+
+
+def _stop(profile: cProfile.Profile, name: str, seconds: float) -> Path:
+    profile.disable()
+    _local.profile = None
+    return save_profile(profile, name, seconds)
+
+
+def _prune():
+    profiles = sorted(PROFILES_DIR.glob("*.prof"))
+    for old in profiles[: max(0, len(profiles) - MAX_SAVED_PROFILES)]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".txt").unlink(missing_ok=True)
+
+
+def save_profile(profile: cProfile.Profile, name: str, seconds: float) -> Path:
+    """Write `<timestamp>-<name>.prof` and its top-cumulative .txt report; returns the .prof path."""
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1e6) % 1000000:06d}"
+    path = PROFILES_DIR / f"{stamp}-{name}.prof"
+    report = io.StringIO()
+    report.write(f"{name}: {seconds * 1000:.1f} ms wall, pid {os.getpid()}, thread {threading.current_thread().name}\n\n")
+    stats = pstats.Stats(profile, stream=report)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_TOP_FUNCTIONS)
+    with _save_lock:
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(path)
+        path.with_suffix(".txt").write_text(report.getvalue(), encoding="utf-8")
+        _prune()
+    return path
+
+
+def profiled(target: str, name: Optional[str] = None):
+    """
+    Decorator: profile every call of the function when `target` is enabled.
+    Returns the function unchanged otherwise.
+    """
+    def decorator(fn):
+        if target not in ENABLED_TARGETS:
+            return fn
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profile = _start()
+            if profile is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _stop(profile, label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@lru_cache(maxsize=4)
+def _compiled(script_path: str, mtime_ns: int):
+    with open(script_path, encoding="utf-8") as f:
+        return compile(f.read(), script_path, "exec")
+
+
+def in_profiled_rerun() -> bool:
+    return getattr(_local, "in_rerun", False)
+
+
+def run_profiled_rerun(script_path: str, script_globals: Dict):
+    """
+    Run the app script once more, inside this call, under the profiler. The
+    profile is saved however the run ends, including st.rerun(), st.stop()
+    and errors, which propagate. The caller stops its own run afterwards.
+    """
+    profile = _start()
+    _local.in_rerun = True
+    start = time.perf_counter()
+    try:
+        code = _compiled(script_path, os.stat(script_path).st_mtime_ns)
+        exec(code, script_globals)
+    finally:
+        _local.in_rerun = False
+        if profile is not None:
+            _stop(profile, "rerun", time.perf_counter() - start)
@@ -1,11 +1,21 @@
-QUESTION_GEN_PROMPT = """
+# How the distractors field is described, depending on who writes them
+DISTRACTORS_FROM_LLM = "list of 3 strings"
+DISTRACTORS_LOCAL = "always an empty list [], distractors are added later"
+
+# Extra rule for follow-up questions on one topic
+FOCUS_TOPIC_RULE = "- Only ask about this topic: {topic}. Skip material on other topics.\n"
+
+# The instructions come first and are the same for every chunk, so the local
+# backend encodes them once (see models.local_backend) and remote providers
+# can reuse their prompt cache; everything that varies is in the request
+QUESTION_GEN_INSTRUCTIONS = """
 You are an expert exam question generator.
 
-Given the following study material, generate {num_questions} questions in JSON list.
+Given study material, generate questions as a JSON list.
 Each item must have:
 - question (string)
 - answer (string)
-- distractors (list of 3 strings)
+- distractors ({distractors_field})
 - difficulty (one of: "easy", "medium", "hard")
 - topic (short topic name)
 - type (one of: "mcq", "true_false", "short_answer", "fill_blank")
@@ -16,9 +26,12 @@ Very important rules:
 - For 'Where' questions, answer and all distractors must be places/locations.
 - For 'What' or 'Which' questions, answer and distractors must be the same type of thing.
 - Never mix different kinds of answers in the same question.
-
 Return ONLY valid JSON array, no extra text.
 
+"""
+
+QUESTION_GEN_REQUEST = """Generate {num_questions} questions.
+{focus_rule}
 Study material:
 \"\"\"{context}\"\"\"
 """
@@ -1,19 +1,36 @@
+import hashlib
 import pdfplumber
 import re
-from typing import List
+import zlib
+from typing import List, NamedTuple
 
-def extract_text_from_pdf(file_path: str) -> str:
-    text = []
+from utils.instrumentation import timed, incr
+from utils.profiling import profiled
+
+@profiled("extraction")
+@timed("extract_pages_from_pdf")
+def extract_pages_from_pdf(file_path: str) -> List[str]:
+    pages = []
     with pdfplumber.open(file_path) as pdf:
         for page in pdf.pages:
             page_text = page.extract_text() or ""
-            text.append(page_text)
-    return "\n".join(text)
+            pages.append(page_text)
+            # Release the page's parsed layout; pdfplumber otherwise keeps
+            # every page cached until the file is closed
+            page.close()
+    incr("pdf_pages", len(pages))
+    return pages
+
+@timed("extract_text_from_pdf")
+def extract_text_from_pdf(file_path: str) -> str:
+    return "\n".join(extract_pages_from_pdf(file_path))
 
+@timed("clean_text")
 def clean_text(text: str) -> str:
     text = re.sub(r"\s+", " ", text)
     return text.strip()
 
+@timed("split_into_chunks")
 def split_into_chunks(text: str, max_tokens: int = 800) -> List[str]:
     words = text.split()
     chunks, current = [], []
@@ -26,4 +43,55 @@ def split_into_chunks(text: str, max_tokens: int = 800) -> List[str]:
             current, count = [], 0
     if current:
         chunks.append(" ".join(current))
+    incr("chunks", len(chunks))
+    return chunks
+
+# A chunk may end after a word whose CRC32 is a multiple of this (see chunk_pages)
+CHUNK_ANCHOR_EVERY = 64
+# ...once it holds this share of max_tokens
+CHUNK_MIN_FILL = 0.875
+
+def content_hash(text: str) -> str:
+    """Hash of the words of `text`, so whitespace-only extraction differences do not count as edits."""
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()[:16]
+
+def _is_anchor(word: str) -> bool:
+    # crc32 rather than hash(), which differs between processes
+    return zlib.crc32(word.encode("utf-8")) % CHUNK_ANCHOR_EVERY == 0
+
+class PageChunk(NamedTuple):
+    text: str
+    # 0-based pages the chunk's text comes from
+    first_page: int
+    last_page: int
+
+@timed("split_pages_into_chunks")
+def chunk_pages(pages: List[str], max_tokens: int = 800) -> List[PageChunk]:
+    """
+    Like split_into_chunks, but keeps track of the pages of each chunk.
+    Chunks run over page breaks; once a chunk holds CHUNK_MIN_FILL of
+    max_tokens it ends after the next anchor word (content-defined, see
+    _is_anchor), and at max_tokens at the latest. Chunks therefore stay
+    close to max_tokens, and an edit only moves the boundaries around it.
+    """
+    min_words = int(max_tokens * CHUNK_MIN_FILL)
+    chunks: List[PageChunk] = []
+    current: List[str] = []
+    first = 0
+    for number, page in enumerate(pages):
+        for word in page.split():
+            if not current:
+                first = number
+            current.append(word)
+            if len(current) >= max_tokens or (len(current) >= min_words and _is_anchor(word)):
+                chunks.append(PageChunk(" ".join(current), first, number))
+                current = []
+        if current:
+            last = number
+    if current:
+        chunks.append(PageChunk(" ".join(current), first, last))
+    incr("chunks", len(chunks))
     return chunks
+
+def split_pages_into_chunks(pages: List[str], max_tokens: int = 800) -> List[str]:
+    return [chunk.text for chunk in chunk_pages(pages, max_tokens)]